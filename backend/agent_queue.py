@@ -1,79 +1,613 @@
-import os, time, json, sqlite3
-from typing import Optional, Dict, Any, List, Tuple
+import os, time, json, gzip, sqlite3, threading
+from typing import Optional, Dict, Any, List, Tuple, Callable
 
 DB_PATH = os.getenv("STATION_AGENT_DB", os.path.join(os.path.dirname(__file__), "agent_queue.sqlite3"))
+BUSY_TIMEOUT_MS = int(os.getenv("STATION_AGENT_DB_BUSY_MS", "5000"))
+CLAIM_BATCH_MAX = int(os.getenv("STATION_AGENT_CLAIM_MAX", "100"))
+LEASE_SEC = int(os.getenv("STATION_AGENT_LEASE_SEC", "300"))
+# Upper bound for a heartbeat's extend_sec, so a runner cannot hold a task forever.
+LEASE_MAX_SEC = int(os.getenv("STATION_AGENT_LEASE_MAX_SEC", "3600"))
+MAX_ATTEMPTS = int(os.getenv("STATION_AGENT_MAX_ATTEMPTS", "3"))
+REAP_INTERVAL_SEC = float(os.getenv("STATION_AGENT_REAP_SEC", "15"))
+# Retention: finished tasks older than RETAIN_SEC, or beyond the newest
+# RETAIN_MAX finished rows, are moved to gzip JSONL segments in ARCHIVE_DIR.
+RETAIN_SEC = int(os.getenv("STATION_AGENT_RETAIN_SEC", str(7 * 86400)))
+RETAIN_MAX = int(os.getenv("STATION_AGENT_RETAIN_MAX", "10000"))
+ARCHIVE_DIR = os.getenv("STATION_AGENT_ARCHIVE_DIR", os.path.join(os.path.dirname(DB_PATH), "agent_archive"))
+ARCHIVE_BATCH = 5000
+# Task output goes to append-only files, not SQLite; result_json keeps a
+# summary and points at the log when the runner's result is too large.
+LOG_DIR = os.getenv("STATION_AGENT_LOG_DIR", os.path.join(os.path.dirname(DB_PATH), "agent_logs"))
+RESULT_MAX_BYTES = int(os.getenv("STATION_AGENT_RESULT_MAX", "65536"))
+SUBMIT_BATCH_MAX = int(os.getenv("STATION_AGENT_SUBMIT_MAX", "1000"))
+MAINT_INTERVAL_SEC = float(os.getenv("STATION_AGENT_MAINT_SEC", "600"))
+FINISHED = ("done", "failed", "dead")
+# "shell=4,llm=1": relative share of claims per task_type when several have work queued.
+TYPE_WEIGHTS = {
+    k.strip(): float(v)
+    for k, v in (kv.split("=", 1) for kv in os.getenv("STATION_AGENT_TYPE_WEIGHTS", "").split(",") if "=" in kv)
+}
 
-def _db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS tasks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        created_at INTEGER NOT NULL,
-        status TEXT NOT NULL,
-        runner_id TEXT,
-        task_type TEXT NOT NULL,
-        payload_json TEXT NOT NULL,
-        result_json TEXT,
-        error_text TEXT
-    )
-    """)
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, created_at)")
-    conn.commit()
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready: set = set()
+_reaper: Optional[threading.Thread] = None
+_listeners: List[Callable[[], None]] = []
+_vtime: Dict[str, float] = {}
+_log_lock = threading.Lock()
+
+def _init_schema(conn: sqlite3.Connection) -> None:
+    # DDL runs once per database file per process, not once per call.
+    with _schema_lock:
+        if DB_PATH in _schema_ready:
+            return
+        # Only takes effect on a fresh file; compact() converts older ones.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            runner_id TEXT,
+            task_type TEXT NOT NULL,
+            payload_json TEXT NOT NULL,
+            result_json TEXT,
+            error_text TEXT
+        )
+        """)
+        _migrate(conn)
+        # Superseded by idx_tasks_claim and the covering list indexes below.
+        for old in ("idx_tasks_status", "idx_tasks_lease", "idx_tasks_status_id",
+                    "idx_tasks_type_id", "idx_tasks_type_status_id"):
+            conn.execute(f"DROP INDEX IF EXISTS {old}")
+        # Partial index over queued rows only: claim cost tracks the backlog,
+        # not the number of finished tasks kept in the table.
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks(task_type, priority DESC, created_at, id) "
+            "WHERE status='queued'"
+        )
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_idem ON tasks(idem_key) WHERE idem_key IS NOT NULL")
+        # list_recent pages newest-first by id within a status / task_type and
+        # reads only _LIGHT_COLS, so these cover it without touching table rows.
+        # The status one also serves the lease reaper, stats and the per-runner
+        # held count (running rows are few); type+status filters the type one.
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_list_status ON tasks(status, id, created_at, runner_id, "
+            "task_type, error_text, leased_until, attempts, priority, finished_at)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_list_type ON tasks(task_type, id, created_at, status, "
+            "runner_id, error_text, leased_until, attempts, priority, finished_at)"
+        )
+        # DAG edges: a 'blocked' task is queued once every parent is done.
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS task_deps (
+            task_id INTEGER NOT NULL,
+            parent_id INTEGER NOT NULL,
+            PRIMARY KEY (task_id, parent_id)
+        ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_task_deps_parent ON task_deps(parent_id)")
+        conn.commit()
+        _schema_ready.add(DB_PATH)
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(tasks)").fetchall()}
+    if "leased_until" not in cols:
+        conn.execute("ALTER TABLE tasks ADD COLUMN leased_until INTEGER")
+        # Rows claimed before leases existed get one lease window to finish.
+        conn.execute(
+            "UPDATE tasks SET leased_until=? WHERE status='running' AND leased_until IS NULL",
+            (_now() + LEASE_SEC,),
+        )
+    if "attempts" not in cols:
+        conn.execute("ALTER TABLE tasks ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    if "priority" not in cols:
+        conn.execute("ALTER TABLE tasks ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+    if "finished_at" not in cols:
+        conn.execute("ALTER TABLE tasks ADD COLUMN finished_at INTEGER")
+    if "idem_key" not in cols:
+        conn.execute("ALTER TABLE tasks ADD COLUMN idem_key TEXT")
+
+def _db() -> sqlite3.Connection:
+    # One long-lived connection per thread; sqlite3 keeps its own prepared
+    # statement cache per connection, so reusing it also reuses the plans.
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000.0, cached_statements=256)
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS};")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    _init_schema(conn)
+    _local.conn = conn
+    _local.path = DB_PATH
     return conn
 
+def close_db() -> None:
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+        _local.path = None
+
 def _now() -> int:
     return int(time.time())
 
-def submit_task(task_type: str, payload: Dict[str, Any]) -> int:
+def add_listener(fn: Callable[[], None]) -> None:
+    """Register a callback fired whenever new work becomes claimable."""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+def _notify() -> None:
+    for fn in list(_listeners):
+        try:
+            fn()
+        except Exception:
+            pass
+
+def submit_task(
+    task_type: str,
+    payload: Dict[str, Any],
+    priority: int = 0,
+    idem_key: Optional[str] = None,
+    depends_on: Optional[List[int]] = None,
+) -> int:
+    return submit_batch([{
+        "task_type": task_type, "payload": payload, "priority": priority,
+        "idempotency_key": idem_key, "depends_on": depends_on,
+    }])[0]["task_id"]
+
+def _in_chunks(conn: sqlite3.Connection, sql: str, values: List[Any]) -> List[Tuple]:
+    # `sql` holds one {} placeholder for an IN (...) list; stays under SQLite's variable limit.
+    out: List[Tuple] = []
+    for i in range(0, len(values), 500):
+        chunk = values[i:i + 500]
+        out.extend(conn.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall())
+    return out
+
+def _depends_on(raw: Any) -> List[int]:
+    # Strict: a string such as "12" would otherwise iterate as parents 1 and 2.
+    if raw is None:
+        return []
+    if not isinstance(raw, list) or not all(isinstance(p, int) and not isinstance(p, bool) and p > 0 for p in raw):
+        raise ValueError("depends_on must be a list of task ids")
+    return sorted(set(raw))
+
+def submit_batch(tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert many tasks in one transaction; returns {task_id, duplicate} per input, in order.
+
+    A task whose idempotency_key already exists (in the table or earlier in
+    the batch) is not inserted again; its existing id is returned instead.
+    Tasks with depends_on start 'blocked' until every parent is done, and
+    fail immediately if a parent already failed.
+    """
+    if len(tasks) > SUBMIT_BATCH_MAX:
+        raise ValueError(f"batch too large (max {SUBMIT_BATCH_MAX})")
+    now = _now()
+    deps = [_depends_on(t.get("depends_on")) for t in tasks]
     conn = _db()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO tasks(created_at, status, runner_id, task_type, payload_json) VALUES(?, 'queued', NULL, ?, ?)",
-        (_now(), task_type, json.dumps(payload, ensure_ascii=True)),
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        parents = sorted({p for d in deps for p in d})
+        state = dict(_in_chunks(conn, "SELECT id, status FROM tasks WHERE id IN ({})", parents))
+        missing = [p for p in parents if p not in state]
+        if missing:
+            raise ValueError(f"unknown dependency: {missing}")
+        rows = []
+        for t, d in zip(tasks, deps):
+            st = [state[p] for p in d]
+            if any(x in ("failed", "dead") for x in st):
+                status, err, fin = "failed", "dependency_failed", now
+            elif all(x == "done" for x in st):
+                status, err, fin = "queued", None, None
+            else:
+                status, err, fin = "blocked", None, None
+            rows.append((
+                now, status, str(t.get("task_type") or "shell"), json.dumps(t.get("payload") or {}, ensure_ascii=True),
+                int(t.get("priority") or 0), t.get("idempotency_key") or None, err, fin,
+            ))
+        # Under the write lock AUTOINCREMENT hands out increasing ids, so the
+        # rows above `before` are exactly the ones this batch inserted, in order.
+        before = conn.execute("SELECT COALESCE(MAX(id), 0) FROM tasks").fetchone()[0]
+        conn.executemany(
+            "INSERT OR IGNORE INTO tasks(created_at, status, runner_id, task_type, payload_json, priority, idem_key, error_text, finished_at) "
+            "VALUES(?, ?, NULL, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        new_ids = [r[0] for r in conn.execute("SELECT id FROM tasks WHERE id > ? ORDER BY id", (before,)).fetchall()]
+        by_key = dict(_in_chunks(conn, "SELECT idem_key, id FROM tasks WHERE idem_key IN ({})", list({r[5] for r in rows if r[5]})))
+        out, it, new_set, seen, edges = [], iter(new_ids), set(new_ids), set(), []
+        for r, d in zip(rows, deps):
+            key = r[5]
+            if key is None:
+                tid, dup = next(it), False
+            else:
+                tid = by_key[key]
+                dup = not (tid in new_set and key not in seen)
+                if not dup:
+                    next(it)
+                seen.add(key)
+            if not dup:
+                edges.extend((tid, p) for p in d)
+            out.append({"task_id": tid, "duplicate": dup})
+        if edges:
+            conn.executemany("INSERT OR IGNORE INTO task_deps(task_id, parent_id) VALUES(?, ?)", edges)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if new_ids:
+        _notify()
+    return out
+
+def _release_children(conn: sqlite3.Connection, tid: int, ok: bool, now: int) -> int:
+    """Queue blocked children whose parents are now all done, or fail every
+    blocked descendant when a parent failed. Runs inside the caller's transaction."""
+    if ok:
+        return conn.execute(
+            "UPDATE tasks SET status='queued' WHERE status='blocked' "
+            "AND id IN (SELECT task_id FROM task_deps WHERE parent_id=?) "
+            "AND NOT EXISTS (SELECT 1 FROM task_deps d JOIN tasks p ON p.id=d.parent_id "
+            "WHERE d.task_id=tasks.id AND p.status != 'done')",
+            (tid,),
+        ).rowcount
+    conn.execute(
+        "WITH RECURSIVE down(id) AS ("
+        " SELECT task_id FROM task_deps WHERE parent_id=?"
+        " UNION SELECT d.task_id FROM task_deps d JOIN down ON d.parent_id=down.id) "
+        "UPDATE tasks SET status='failed', error_text='dependency_failed', finished_at=? "
+        "WHERE status='blocked' AND id IN (SELECT id FROM down)",
+        (tid, now),
     )
-    conn.commit()
-    tid = int(cur.lastrowid)
-    conn.close()
-    return tid
+    return 0
 
-def claim_next(runner_id: str) -> Optional[Tuple[int, Dict[str, Any], str]]:
-    conn = _db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, payload_json, task_type FROM tasks WHERE status='queued' ORDER BY created_at ASC LIMIT 1")
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return None
-    tid, payload_json, task_type = row
-    cur.execute("UPDATE tasks SET status='running', runner_id=? WHERE id=? AND status='queued'", (runner_id, tid))
-    conn.commit()
-    cur.execute("SELECT status FROM tasks WHERE id=?", (tid,))
-    st = cur.fetchone()
-    if not st or st[0] != "running":
-        conn.close()
+def parent_results(tids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """{child_id: {parent_id: parent_result}} for the given tasks that have parents."""
+    out: Dict[int, Dict[str, Any]] = {}
+    rows = _in_chunks(
+        _db(),
+        "SELECT d.task_id, d.parent_id, p.result_json FROM task_deps d LEFT JOIN tasks p ON p.id=d.parent_id "
+        "WHERE d.task_id IN ({})",
+        list(tids),
+    )
+    for tid, pid, result_json in rows:
+        out.setdefault(tid, {})[str(pid)] = json.loads(result_json) if result_json else None
+    return out
+
+def _queued_types(conn: sqlite3.Connection) -> List[str]:
+    # Loose index scan over idx_tasks_claim: one O(log n) probe per distinct type.
+    rows = conn.execute("""
+        WITH RECURSIVE t(tt) AS (
+            SELECT MIN(task_type) FROM tasks INDEXED BY idx_tasks_claim WHERE status='queued'
+            UNION ALL
+            SELECT (SELECT MIN(task_type) FROM tasks INDEXED BY idx_tasks_claim WHERE status='queued' AND task_type > t.tt)
+            FROM t WHERE t.tt IS NOT NULL
+        )
+        SELECT tt FROM t WHERE tt IS NOT NULL
+    """).fetchall()
+    return [r[0] for r in rows]
+
+def _pick(conn: sqlite3.Connection, task_types: Optional[List[str]]) -> Optional[Tuple[int, str, str]]:
+    """Choose the next task: highest priority first, then the task_type with the
+    lowest weighted virtual time (stride scheduling), FIFO within a type."""
+    types = _queued_types(conn)
+    if task_types:
+        types = [t for t in types if t in task_types]
+    heads = []
+    for tt in types:
+        row = conn.execute(
+            "SELECT id, task_type, priority FROM tasks INDEXED BY idx_tasks_claim WHERE status='queued' AND task_type=? "
+            "ORDER BY priority DESC, created_at ASC, id ASC LIMIT 1",
+            (tt,),
+        ).fetchone()
+        if row:
+            heads.append(row)
+    if not heads:
         return None
-    conn.close()
-    return int(tid), json.loads(payload_json), str(task_type)
+    top = max(h[2] for h in heads)
+    lane = [h for h in heads if h[2] == top]
+    # Types that were idle restart at the busiest peer's clock instead of
+    # cashing in the share they did not use.
+    active = [_vtime[h[1]] for h in lane if h[1] in _vtime]
+    floor = min(active) if active else 0.0
+    for h in lane:
+        _vtime[h[1]] = max(_vtime.get(h[1], floor), floor)
+    tid, task_type, _ = min(lane, key=lambda h: (_vtime[h[1]], h[0]))
+    _vtime[task_type] += 1.0 / max(TYPE_WEIGHTS.get(task_type, 1.0), 1e-6)
+    payload_json = conn.execute("SELECT payload_json FROM tasks WHERE id=?", (tid,)).fetchone()[0]
+    return tid, payload_json, task_type
 
-def set_result(tid: int, ok: bool, result: Dict[str, Any], error_text: str = "") -> None:
+def claim_batch(runner_id: str, n: int = 1, task_types: Optional[List[str]] = None,
+                max_held: Optional[int] = None) -> List[Tuple[int, Dict[str, Any], str]]:
+    # BEGIN IMMEDIATE takes the write lock up front, so select-and-mark is one
+    # transaction and concurrent runners queue on busy_timeout instead of
+    # racing for the same row. task_types limits claims to what the runner accepts;
+    # max_held caps how many running tasks runner_id may hold after this claim.
+    n = max(1, min(int(n), CLAIM_BATCH_MAX))
     conn = _db()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE tasks SET status=?, result_json=?, error_text=? WHERE id=?",
-        ("done" if ok else "failed", json.dumps(result, ensure_ascii=True), error_text, tid),
-    )
-    conn.commit()
-    conn.close()
+    rows = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if max_held is not None:
+            held = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE status='running' AND runner_id=?", (runner_id,),
+            ).fetchone()[0]
+            n = min(n, max(0, int(max_held) - held))
+        leased_until = _now() + LEASE_SEC
+        while len(rows) < n:
+            got = _pick(conn, task_types)
+            if not got:
+                break
+            conn.execute(
+                "UPDATE tasks SET status='running', runner_id=?, leased_until=?, attempts=attempts+1 WHERE id=?",
+                (runner_id, leased_until, got[0]),
+            )
+            rows.append(got)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return [(int(tid), json.loads(payload_json), str(task_type)) for tid, payload_json, task_type in rows]
 
-def get_task(tid: int) -> Optional[Dict[str, Any]]:
+def claim_next(runner_id: str, task_types: Optional[List[str]] = None) -> Optional[Tuple[int, Dict[str, Any], str]]:
+    got = claim_batch(runner_id, 1, task_types)
+    return got[0] if got else None
+
+def log_path(tid: int) -> str:
+    return os.path.join(LOG_DIR, f"{int(tid)}.log")
+
+def archived_log_path(tid: int) -> str:
+    return os.path.join(ARCHIVE_DIR, "logs", f"{int(tid)}.log")
+
+def _log_paths(tid: int, archived: bool) -> List[str]:
+    # Readers fall back to the archive: archive_finished moves a task's log there.
+    return [log_path(tid), archived_log_path(tid)] if archived else [log_path(tid)]
+
+def log_size(tid: int, archived: bool = False) -> int:
+    for p in _log_paths(tid, archived):
+        try:
+            return os.path.getsize(p)
+        except OSError:
+            pass
+    return 0
+
+def append_log(tid: int, data: bytes, offset: Optional[int] = None) -> int:
+    """Append a chunk to the task's log; returns the new size.
+
+    With offset, a retried chunk that is already fully on disk is accepted as
+    a no-op; any other mismatch raises ValueError carrying the current size.
+    """
+    os.makedirs(LOG_DIR, exist_ok=True)
+    with _log_lock:
+        size = log_size(tid)
+        if offset is not None and int(offset) != size:
+            if int(offset) + len(data) <= size:
+                return size
+            raise ValueError(size)
+        with open(log_path(tid), "ab") as f:
+            f.write(data)
+        return size + len(data)
+
+def task_status(tid: int) -> Optional[str]:
+    row = _db().execute("SELECT status FROM tasks WHERE id=?", (tid,)).fetchone()
+    return row[0] if row else None
+
+def read_log(tid: int, offset: int = 0, limit: int = 65536) -> bytes:
+    """Raw bytes of the task's log, live or archived; callers decode."""
+    for p in _log_paths(tid, True):
+        try:
+            with open(p, "rb") as f:
+                f.seek(max(0, int(offset)))
+                return f.read(max(0, int(limit)))
+        except OSError:
+            pass
+    return b""
+
+def _result_json(tid: int, result: Dict[str, Any]) -> str:
+    raw = json.dumps(result, ensure_ascii=True)
+    size = log_size(tid)
+    if len(raw) <= RESULT_MAX_BYTES and not size:
+        return raw
+    if len(raw) > RESULT_MAX_BYTES:
+        # Oversized results are moved into the log; the row keeps a preview.
+        size = append_log(tid, b"\n[result]\n" + raw.encode("ascii") + b"\n")
+        result = {"truncated": True, "summary": raw[:1024]}
+    return json.dumps(dict(result, log={"path": log_path(tid), "bytes": size}), ensure_ascii=True)
+
+def set_result(tid: int, runner_id: str, ok: bool, result: Dict[str, Any], error_text: str = "") -> bool:
+    """Finish a task held by runner_id. Returns False and changes nothing when
+    the runner no longer holds it (requeued, dead-lettered, already finished,
+    or reclaimed by another runner), so a stale result cannot release children."""
+    now = _now()
     conn = _db()
-    cur = conn.cursor()
-    cur.execute("SELECT id, created_at, status, runner_id, task_type, payload_json, result_json, error_text FROM tasks WHERE id=?", (tid,))
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        held = conn.execute(
+            "SELECT 1 FROM tasks WHERE id=? AND status='running' AND runner_id=?", (tid, runner_id),
+        ).fetchone()
+        if not held:
+            conn.rollback()
+            return False
+        conn.execute(
+            "UPDATE tasks SET status=?, result_json=?, error_text=?, leased_until=NULL, finished_at=? "
+            "WHERE id=? AND status='running' AND runner_id=?",
+            ("done" if ok else "failed", _result_json(tid, result), error_text, now, tid, runner_id),
+        )
+        released = _release_children(conn, tid, ok, now)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if released:
+        _notify()
+    return True
+
+def heartbeat(tid: int, runner_id: str, extend_sec: Optional[int] = None) -> Optional[int]:
+    """Extend the lease of a running task held by runner_id; returns the new
+    deadline. extend_sec is clamped to [1, LEASE_MAX_SEC]."""
+    leased_until = _now() + max(1, min(int(extend_sec or LEASE_SEC), LEASE_MAX_SEC))
+    conn = _db()
+    with conn:
+        cur = conn.execute(
+            "UPDATE tasks SET leased_until=? WHERE id=? AND status='running' AND runner_id=?",
+            (leased_until, tid, runner_id),
+        )
+    return leased_until if cur.rowcount == 1 else None
+
+def requeue_expired() -> Dict[str, int]:
+    """Requeue running tasks whose lease ran out; dead-letter them after MAX_ATTEMPTS."""
+    now = _now()
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        dead_ids = [r[0] for r in conn.execute(
+            "SELECT id FROM tasks WHERE status='running' AND leased_until < ? AND attempts >= ?",
+            (now, MAX_ATTEMPTS),
+        ).fetchall()]
+        for tid in dead_ids:
+            conn.execute(
+                "UPDATE tasks SET status='dead', leased_until=NULL, error_text='lease_expired', finished_at=? WHERE id=?",
+                (now, tid),
+            )
+            _release_children(conn, tid, False, now)
+        dead = len(dead_ids)
+        requeued = conn.execute(
+            "UPDATE tasks SET status='queued', runner_id=NULL, leased_until=NULL "
+            "WHERE status='running' AND leased_until < ?",
+            (now,),
+        ).rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if requeued:
+        _notify()
+    return {"requeued": requeued, "dead": dead}
+
+def archive_finished(now: Optional[int] = None) -> Dict[str, Any]:
+    """Move finished tasks past the retention policy into a gzip JSONL segment."""
+    now = now or _now()
+    conn = _db()
+    q = ",".join("?" * len(FINISHED))
+    # Id of the oldest finished row still inside the RETAIN_MAX window.
+    keep = conn.execute(
+        f"SELECT id FROM tasks WHERE status IN ({q}) ORDER BY id DESC LIMIT 1 OFFSET ?",
+        (*FINISHED, max(0, RETAIN_MAX - 1)),
+    ).fetchone()
+    # A parent stays while any child is unfinished: the child still needs its
+    # result (parent_results) and a late submit may still depend on it.
+    rows = conn.execute(
+        f"SELECT {_FULL_COLS} FROM tasks WHERE status IN ({q}) "
+        "AND (COALESCE(finished_at, created_at) < ? OR id < ?) "
+        "AND NOT EXISTS (SELECT 1 FROM task_deps d JOIN tasks c ON c.id=d.task_id "
+        f"WHERE d.parent_id=tasks.id AND c.status NOT IN ({q})) "
+        "ORDER BY id ASC LIMIT ?",
+        (*FINISHED, now - RETAIN_SEC, keep[0] if keep else 0, *FINISHED, ARCHIVE_BATCH),
+    ).fetchall()
+    if not rows:
+        return {"archived": 0, "segment": None}
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    seg = os.path.join(ARCHIVE_DIR, f"tasks_{rows[0][0]:012d}_{rows[-1][0]:012d}.jsonl.gz")
+    # Segment is durable before rows are deleted: a crash can duplicate, never lose.
+    # Logs move before the delete, and the archived rows already point at
+    # their new location.
+    with gzip.open(seg + ".tmp", "wt", encoding="utf-8") as f:
+        for row in rows:
+            t = _full_row(row)
+            log = t["result"].get("log") if isinstance(t["result"], dict) else None
+            if isinstance(log, dict):
+                log["path"] = archived_log_path(t["id"])
+            f.write(json.dumps(t, ensure_ascii=True) + "\n")
+    os.replace(seg + ".tmp", seg)
+    for r in rows:
+        if os.path.exists(log_path(r[0])):
+            os.makedirs(os.path.join(ARCHIVE_DIR, "logs"), exist_ok=True)
+            os.replace(log_path(r[0]), archived_log_path(r[0]))
+    with conn:
+        conn.executemany("DELETE FROM tasks WHERE id=?", [(r[0],) for r in rows])
+        conn.executemany("DELETE FROM task_deps WHERE task_id=?", [(r[0],) for r in rows])
+    return {"archived": len(rows), "segment": seg}
+
+def compact(pages: int = 2000, full: bool = False) -> Dict[str, Any]:
+    """Checkpoint the WAL and hand free pages back to the filesystem.
+    full=True also rebuilds a file created before auto_vacuum was set; that
+    VACUUM holds the write lock for the whole rebuild, so it only runs on
+    demand (POST /agent/tasks/compact), never from the reaper."""
+    conn = _db()
+    incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    out: Dict[str, Any] = {"vacuumed": False}
+    if incremental:
+        # executescript steps the pragma to completion; execute() frees one page.
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    elif full:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.execute("VACUUM")
+        out["vacuumed"] = True
+    else:
+        out["needs_full_compact"] = True
+    ckpt = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    out["wal_checkpoint"] = {"busy": ckpt[0], "log": ckpt[1], "checkpointed": ckpt[2]}
+    return out
+
+def maintain() -> Dict[str, Any]:
+    out = {"archived": 0}
+    while True:
+        got = archive_finished()
+        out["archived"] += got["archived"]
+        if got["archived"] < ARCHIVE_BATCH:
+            break
+    out.update(compact())
+    return out
+
+def stats() -> Dict[str, Any]:
+    conn = _db()
+    by_status = dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    wal = DB_PATH + "-wal"
+    segs = [e for e in os.scandir(ARCHIVE_DIR) if e.name.endswith(".jsonl.gz")] if os.path.isdir(ARCHIVE_DIR) else []
+    return {
+        "by_status": by_status,
+        "queue_depth": by_status.get("queued", 0),
+        "db_bytes": page_size * page_count,
+        "free_bytes": page_size * freelist,
+        "wal_bytes": os.path.getsize(wal) if os.path.exists(wal) else 0,
+        "archive": {"segments": len(segs), "bytes": sum(e.stat().st_size for e in segs), "dir": ARCHIVE_DIR},
+        "retention": {"max_age_sec": RETAIN_SEC, "max_finished": RETAIN_MAX},
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0]),
+    }
+
+def _reap_loop(interval: float) -> None:
+    next_maint = time.monotonic() + MAINT_INTERVAL_SEC
+    while True:
+        try:
+            requeue_expired()
+        except Exception:
+            pass
+        if time.monotonic() >= next_maint:
+            next_maint = time.monotonic() + MAINT_INTERVAL_SEC
+            try:
+                maintain()
+            except Exception:
+                pass
+        time.sleep(interval)
+
+def start_reaper(interval: Optional[float] = None) -> None:
+    global _reaper
+    if _reaper is not None and _reaper.is_alive():
+        return
+    _reaper = threading.Thread(target=_reap_loop, args=(interval or REAP_INTERVAL_SEC,), name="agent-queue-reaper", daemon=True)
+    _reaper.start()
+
+_LIGHT_COLS = "id, created_at, status, runner_id, task_type, error_text, leased_until, attempts, priority, finished_at"
+_FULL_COLS = "id, created_at, status, runner_id, task_type, payload_json, result_json, error_text, leased_until, attempts, priority, finished_at, idem_key"
+
+def _full_row(row) -> Dict[str, Any]:
     return {
         "id": row[0],
         "created_at": row[1],
@@ -83,17 +617,62 @@ def get_task(tid: int) -> Optional[Dict[str, Any]]:
         "payload": json.loads(row[5]) if row[5] else None,
         "result": json.loads(row[6]) if row[6] else None,
         "error": row[7],
+        "leased_until": row[8],
+        "attempts": row[9],
+        "priority": row[10],
+        "finished_at": row[11],
+        "idempotency_key": row[12],
     }
 
-def list_recent(limit: int = 25) -> List[Dict[str, Any]]:
+def get_task(tid: int) -> Optional[Dict[str, Any]]:
     conn = _db()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM tasks ORDER BY id DESC LIMIT ?", (int(limit),))
-    ids = [r[0] for r in cur.fetchall()]
-    conn.close()
+    row = conn.execute(f"SELECT {_FULL_COLS} FROM tasks WHERE id=?", (tid,)).fetchone()
+    if not row:
+        return None
+    t = _full_row(row)
+    t["depends_on"] = [r[0] for r in conn.execute("SELECT parent_id FROM task_deps WHERE task_id=?", (tid,)).fetchall()]
+    return t
+
+def list_recent(
+    limit: int = 25,
+    before_id: Optional[int] = None,
+    status: Optional[str] = None,
+    task_type: Optional[str] = None,
+    full: bool = False,
+) -> List[Dict[str, Any]]:
+    """Newest-first page of tasks in one query; pass the last id as before_id for the next page."""
+    where, args = [], []
+    if before_id:
+        where.append("id < ?")
+        args.append(int(before_id))
+    if status:
+        where.append("status = ?")
+        args.append(status)
+    if task_type:
+        where.append("task_type = ?")
+        args.append(task_type)
+    cols = _LIGHT_COLS + (", payload_json, result_json" if full else "")
+    sql = f"SELECT {cols} FROM tasks"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC LIMIT ?"
+    args.append(max(1, min(int(limit), 200)))
     out = []
-    for tid in ids:
-        t = get_task(int(tid))
-        if t:
-            out.append(t)
+    for row in _db().execute(sql, args).fetchall():
+        t = {
+            "id": row[0],
+            "created_at": row[1],
+            "status": row[2],
+            "runner_id": row[3],
+            "task_type": row[4],
+            "error": row[5],
+            "leased_until": row[6],
+            "attempts": row[7],
+            "priority": row[8],
+            "finished_at": row[9],
+        }
+        if full:
+            t["payload"] = json.loads(row[10]) if row[10] else None
+            t["result"] = json.loads(row[11]) if row[11] else None
+        out.append(t)
     return out
@@ -1,21 +1,13 @@
-import time
-from collections import defaultdict
 from starlette.requests import Request
+import ratelimit
 
-# simple in-memory rate limit (per IP)
-_BUCKET = defaultdict(list)
+# rate limit per IP (shared GCRA limiter, see backend/ratelimit.py)
 WINDOW = 5.0     # seconds
 MAX_REQ = 20
 
 def rate_limit_ok(request: Request) -> bool:
     ip = request.client.host if request.client else "local"
-    now = time.time()
-    q = _BUCKET[ip]
-    q[:] = [t for t in q if now - t < WINDOW]
-    if len(q) >= MAX_REQ:
-        return False
-    q.append(now)
-    return True
+    return ratelimit.allow("guards", ip, MAX_REQ, WINDOW)
 
 def require_room(room: str):
     from app.rooms import acquire_room, release_room
@@ -1,4 +1,5 @@
-import os, time, requests
+import os, time
+import http_pool, llm_cache
 from starlette.responses import JSONResponse
 from starlette.requests import Request
 from starlette.routing import Route
@@ -27,29 +28,38 @@ def offline_rules(goal: str, ctx: dict) -> dict:
         return {"decision": "senses_pipeline", "steps": ["verify endpoints", "configure keys", "run tests"], "risk": "low"}
     return {"decision": "general_plan", "steps": ["clarify target", "run minimal task", "log outputs"], "risk": "low"}
 
-def online_llm(goal: str, ctx: dict, api_key: str) -> dict:
+async def online_llm(goal: str, ctx: dict, api_key: str, cache: bool = True) -> dict:
     # Uses OpenAI Responses API via HTTPS (no SDK dependency).
     # If internet blocked, it will fall back to offline.
-    url = "https://api.openai.com/v1/responses"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    prompt = {
-        "role": "user",
-        "content": f"Goal: {goal}\nContext(JSON): {ctx}\nReturn JSON with fields: decision, steps[], risk."
-    }
-    body = {"model": "gpt-5", "input": [prompt], "temperature": 0.2}
-    r = requests.post(url, headers=headers, json=body, timeout=15)
-    j = r.json()
-    # try extract text
-    txt = ""
-    try:
-        out = j.get("output") or []
-        for item in out:
-            for c in item.get("content") or []:
-                if c.get("type") == "output_text":
-                    txt += c.get("text","")
-    except Exception:
+    model = "gpt-5"
+
+    async def fetch():
+        url = os.getenv("STATION_OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/") + "/responses"
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        prompt = {
+            "role": "user",
+            "content": f"Goal: {goal}\nContext(JSON): {ctx}\nReturn JSON with fields: decision, steps[], risk."
+        }
+        body = {"model": model, "input": [prompt], "temperature": 0.2}
+        r = await http_pool.request("POST", url, headers=headers, json=body, timeout=15, retry_status=True)
+        j = r.json()
+        # try extract text
         txt = ""
-    return {"raw": j, "text": txt[:3000], "http": r.status_code}
+        try:
+            out = j.get("output") or []
+            for item in out:
+                for c in item.get("content") or []:
+                    if c.get("type") == "output_text":
+                        txt += c.get("text","")
+        except Exception:
+            txt = ""
+        return {"raw": j, "text": txt[:3000], "http": r.status_code}, r.is_success
+
+    if not cache:
+        return {**(await fetch())[0], "cache": "bypass"}
+    k = llm_cache.key(model, goal, ctx, scope=llm_cache.scope_of(api_key))
+    res, source = await llm_cache.cache.get_or_fetch(k, fetch)
+    return {**res, "cache": source}
 
 async def decide(request: Request):
     keys = merged_keys()
@@ -65,7 +75,7 @@ async def decide(request: Request):
     if mode == "online":
         api_key = (os.getenv("STATION_OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY") or keys.get("openai_api_key") or "").strip()
         try:
-            llm = online_llm(goal, ctx, api_key)
+            llm = await online_llm(goal, ctx, api_key, cache=body.get("cache") is not False)
             entry["llm"] = llm
             # if LLM produced JSON-like text, keep it; else keep offline result too
             off = offline_rules(goal, ctx)
@@ -88,7 +98,11 @@ async def get_log(request: Request):
     except Exception: n = 50
     return JSONResponse({"ok": True, "items": tail(n)})
 
+async def get_cache(request: Request):
+    return JSONResponse({"ok": True, "cache": llm_cache.cache.snapshot()})
+
 routes = [
     Route("/api/agent/decide", decide, methods=["POST"]),
     Route("/api/agent/log", get_log, methods=["GET"]),
+    Route("/api/agent/cache", get_cache, methods=["GET"]),
 ]
@@ -39,27 +39,26 @@ async def post_console(request: Request):
     return JSONResponse({"ok": False, "error": "alias_not_allowed", "allowed": sorted(ALIAS.keys())}, status_code=400)
 
   # Import ops_run_cmd handler logic locally (no subprocess duplication)
-  from app.routes.ops_run_cmd import ALLOWED
-  import subprocess
+  from app.routes.ops_run_cmd import ALLOWED, TIMEOUT_SEC
+  import proc_runner
   from pathlib import Path
 
   if cmd not in ALLOWED:
     return JSONResponse({"ok": False, "error": "cmd_not_allowed"}, status_code=400)
 
+  cwd = str(Path(__file__).resolve().parents[3])
+  if body.get("stream") or request.query_params.get("stream") in ("1", "true"):
+    return proc_runner.sse_response(proc_runner.stream(ALLOWED[cmd], cwd=cwd, timeout=TIMEOUT_SEC))
+
   try:
-    p = subprocess.run(
-      ALLOWED[cmd],
-      capture_output=True,
-      text=True,
-      cwd=str(Path(__file__).resolve().parents[3])
-    )
+    rc, out, err = await proc_runner.run(ALLOWED[cmd], cwd=cwd, timeout=TIMEOUT_SEC, request=request)
     return JSONResponse({
       "ok": True,
       "line": line,
       "cmd": cmd,
-      "returncode": p.returncode,
-      "stdout": (p.stdout or "")[-6000:],
-      "stderr": (p.stderr or "")[-6000:]
+      "returncode": rc,
+      "stdout": out[-6000:],
+      "stderr": err[-6000:]
     })
   except Exception as e:
     return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
@@ -1,4 +1,4 @@
-import requests
+import http_pool
 from starlette.responses import JSONResponse
 from starlette.requests import Request
 from starlette.routing import Route
@@ -37,7 +37,7 @@ async def hook_webhook(request: Request):
   if not url:
     return JSONResponse({"ok": False, "hook":"webhook", "error":"webhooks_url_missing"}, status_code=400)
   try:
-    r=requests.post(url, json=payload, timeout=8)
+    r=await http_pool.request("POST", url, json=payload, timeout=8)
     return JSONResponse({"ok": True, "hook":"webhook", "status_code": r.status_code})
   except Exception as e:
     return JSONResponse({"ok": False, "hook":"webhook", "error": str(e)}, status_code=500)
@@ -1,4 +1,5 @@
-import os, json, time, subprocess
+import os, json, time
+import proc_runner
 from pathlib import Path
 from starlette.responses import JSONResponse
 from starlette.requests import Request
@@ -25,6 +26,30 @@ def _auth_ok(request: Request) -> bool:
     got = (request.headers.get("X-Edit-Key") or "").strip()
     return got != "" and got == expected_edit_key()
 
+def _log(entry: dict):
+    with LOG.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+async def _logged(entry: dict, events):
+    # Pass SSE events through and log the run once it ends (or is cut off).
+    out = {"stdout": [], "stderr": []}
+    entry["rc"] = -1
+    try:
+        async for kind, data in events:
+            if kind in out:
+                out[kind].append(data)
+            elif kind == "exit":
+                entry["rc"] = json.loads(data)["rc"]
+            yield kind, data
+    except Exception as e:
+        out["stderr"].append(str(e))
+        yield "error", str(e)
+    finally:
+        await events.aclose()
+        entry["stdout"] = "\n".join(out["stdout"])[:8000]
+        entry["stderr"] = "\n".join(out["stderr"])[:8000]
+        _log(entry)
+
 async def exec_cmd(request: Request):
     if not _auth_ok(request):
         return JSONResponse({"ok": False, "error": "forbidden"}, status_code=403)
@@ -43,18 +68,18 @@ async def exec_cmd(request: Request):
         cwd = str(ROOT)
 
     entry = {"ts": now_iso(), "name": name, "cmd": cmd, "cwd": cwd}
+    if body.get("stream") or request.query_params.get("stream") in ("1", "true"):
+        return proc_runner.sse_response(_logged(entry, proc_runner.stream(cmd, cwd=cwd, timeout=20)))
     try:
-        p = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, timeout=20)
-        entry["rc"] = p.returncode
-        entry["stdout"] = (p.stdout or "")[:8000]
-        entry["stderr"] = (p.stderr or "")[:8000]
+        rc, out, err = await proc_runner.run(cmd, cwd=cwd, timeout=20, request=request)
+        entry["rc"] = rc
+        entry["stdout"] = out[:8000]
+        entry["stderr"] = err[:8000]
     except Exception as e:
         entry["rc"] = -1
         entry["stderr"] = str(e)
 
-    with LOG.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-
+    _log(entry)
     return JSONResponse({"ok": True, "entry": entry, "allowed": sorted(ALLOW.keys())})
 
 async def allowed(request: Request):
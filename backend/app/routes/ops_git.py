@@ -1,4 +1,5 @@
 import os, json, subprocess
+import git_state
 from starlette.responses import JSONResponse
 from starlette.requests import Request
 
@@ -45,16 +46,21 @@ async def git_status(request: Request):
     if not _auth_ok(request):
         return JSONResponse({"error": "forbidden"}, status_code=403)
 
-    rc1, out1 = _run(["bash", "-lc", "git status --porcelain=v1 || true"])
-    rc2, out2 = _run(["bash", "-lc", "git log --oneline -n 5 || true"])
-    rc3, out3 = _run(["bash", "-lc", "git remote -v || true"])
+    # Status is served from git_state's cache; log and remote are re-read
+    # only when something under .git changes.
+    repo = git_state.repo(ROOT_DIR)
+    st = await repo.status(force=request.query_params.get("refresh") in ("1", "true"))
+    rc2, out2, _ = await repo.git(["log", "--oneline", "-n", "5"])
+    rc3, out3, _ = await repo.git(["remote", "-v"])
+    porcelain = "\n".join(git_state.porcelain_v1(st).splitlines()[1:]) if st["ok"] else ""
 
     return JSONResponse({
         "ok": True,
-        "porcelain": out1.strip(),
+        "porcelain": porcelain,
+        "status": st,
         "log": out2.strip(),
         "remote": out3.strip(),
-        "rc": [rc1, rc2, rc3]
+        "rc": [st["rc"], rc2, rc3]
     })
 
 async def git_push(request: Request):
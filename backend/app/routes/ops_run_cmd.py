@@ -1,4 +1,4 @@
-import subprocess
+import proc_runner
 from starlette.responses import JSONResponse
 from starlette.requests import Request
 from starlette.routing import Route
@@ -11,6 +11,7 @@ ALLOWED = {
   "git_status": ["git", "status"],
   "git_log": ["git", "log", "--oneline", "-n", "20"]
 }
+TIMEOUT_SEC = 60
 
 def _auth_ok(request: Request) -> bool:
   got = (request.headers.get("X-Edit-Key") or "").strip()
@@ -31,19 +32,18 @@ async def run_cmd(request: Request):
   if cmd_key not in ALLOWED:
     return JSONResponse({"ok": False, "error": "cmd_not_allowed", "allowed": list(ALLOWED.keys())}, status_code=400)
 
+  cwd = str((__import__("pathlib").Path(__file__).resolve().parents[3]))
+  if body.get("stream") or request.query_params.get("stream") in ("1", "true"):
+    return proc_runner.sse_response(proc_runner.stream(ALLOWED[cmd_key], cwd=cwd, timeout=TIMEOUT_SEC))
+
   try:
-    p = subprocess.run(
-      ALLOWED[cmd_key],
-      capture_output=True,
-      text=True,
-      cwd=str((__import__("pathlib").Path(__file__).resolve().parents[3]))
-    )
+    rc, out, err = await proc_runner.run(ALLOWED[cmd_key], cwd=cwd, timeout=TIMEOUT_SEC, request=request)
     return JSONResponse({
       "ok": True,
       "cmd": cmd_key,
-      "returncode": p.returncode,
-      "stdout": p.stdout[-4000:],
-      "stderr": p.stderr[-4000:]
+      "returncode": rc,
+      "stdout": out[-4000:],
+      "stderr": err[-4000:]
     })
   except Exception as e:
     return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
@@ -1,4 +1,5 @@
-import os, base64, requests, time
+import os, base64, time
+import http_pool
 from starlette.responses import JSONResponse
 from starlette.requests import Request
 from starlette.routing import Route
@@ -26,7 +27,7 @@ async def sense_ocr(request: Request):
     if url:
         payload = {"event":"senses_ocr", "ts": now_iso(), "mode": m, "b64": base64.b64encode(b).decode("ascii")[:200000]}
         try:
-            r = requests.post(url, json=payload, timeout=15)
+            r = await http_pool.request("POST", url, json=payload, timeout=15)
             return JSONResponse({"ok": True, "mode": m, "forwarded": True, "status_code": r.status_code})
         except Exception as e:
             return JSONResponse({"ok": False, "mode": m, "forwarded": False, "error": str(e)}, status_code=500)
@@ -47,7 +48,7 @@ async def sense_stt(request: Request):
     if url:
         payload = {"event":"senses_stt", "ts": now_iso(), "mode": m, "b64": base64.b64encode(b).decode("ascii")[:200000]}
         try:
-            r = requests.post(url, json=payload, timeout=15)
+            r = await http_pool.request("POST", url, json=payload, timeout=15)
             return JSONResponse({"ok": True, "mode": m, "forwarded": True, "status_code": r.status_code})
         except Exception as e:
             return JSONResponse({"ok": False, "mode": m, "forwarded": False, "error": str(e)}, status_code=500)
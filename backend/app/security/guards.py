@@ -1,9 +1,6 @@
-import time
 from fastapi import Request, HTTPException
 from app.core.config import settings
-
-# very light in-memory rate limiter by client ip
-_BUCKET = {}
+import ratelimit
 
 def body_size_guard(request: Request):
     cl = request.headers.get("content-length")
@@ -18,8 +15,5 @@ def body_size_guard(request: Request):
 
 def rate_limit_guard(request: Request):
     ip = request.client.host if request.client else "unknown"
-    now = int(time.time())
-    key = (ip, now // 60)
-    _BUCKET[key] = _BUCKET.get(key, 0) + 1
-    if _BUCKET[key] > settings.rate_limit_rpm:
+    if not ratelimit.allow("security", ip, settings.rate_limit_rpm, 60):
         raise HTTPException(status_code=429, detail="rate limit exceeded")
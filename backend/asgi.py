@@ -1,6 +1,11 @@
-from fastapi import FastAPI, Header, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Any, Optional
-import os, json, time, pathlib, subprocess, platform, tarfile, sqlite3, threading, uuid, hashlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import snapshot_store, rooms_doctor, ratelimit
+import os, json, time, pathlib, subprocess, platform, tarfile, sqlite3, threading, uuid, hashlib, multiprocessing, queue, atexit, collections, asyncio, re, mmap, stat
 
 ROOT = os.environ.get("STATION_ROOT", str(pathlib.Path.home() / "station_root"))
 STATE_DIR = pathlib.Path(ROOT) / "state"
@@ -11,31 +16,35 @@ LOGS_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = str(STATE_DIR / "station.db")
 EDIT_KEY = os.environ.get("STATION_EDIT_KEY", "1234")
 
-# ---------- Rate limit (simple in-memory) ----------
-_rl_lock = threading.Lock()
-_rl_bucket: dict[str, list[float]] = {}
-
+# ---------- Rate limit (shared GCRA limiter) ----------
 def _now() -> float:
     return time.time()
 
 def rate_limit(key: str, limit: int = 60, window_sec: int = 60):
-    t = _now()
-    with _rl_lock:
-        arr = _rl_bucket.get(key, [])
-        arr = [x for x in arr if t - x <= window_sec]
-        if len(arr) >= limit:
-            raise HTTPException(status_code=429, detail="rate limit")
-        arr.append(t)
-        _rl_bucket[key] = arr
+    ok, retry = ratelimit.check("asgi", key, limit, window_sec)
+    if not ok:
+        raise HTTPException(status_code=429, detail="rate limit", headers={"Retry-After": str(int(retry) + 1)})
 
 def guard(edit_key: Optional[str]):
     if edit_key != EDIT_KEY:
         raise HTTPException(status_code=403, detail="edit key required")
 
 # ---------- SQLite store ----------
+DB_BUSY_MS = int(os.environ.get("STATION_DB_BUSY_MS", "5000"))
+_db_local = threading.local()
+
 def db():
-    con = sqlite3.connect(DB_PATH)
-    con.execute("PRAGMA journal_mode=WAL;")
+    # One autocommit connection per thread, opened once with tuned pragmas.
+    # Multi-statement writes use explicit BEGIN IMMEDIATE ... COMMIT.
+    con = getattr(_db_local, "con", None)
+    if con is None:
+        con = sqlite3.connect(DB_PATH, isolation_level=None, cached_statements=128)
+        con.execute(f"PRAGMA busy_timeout={DB_BUSY_MS}")
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA temp_store=MEMORY")
+        con.execute("PRAGMA cache_size=-8000")
+        _db_local.con = con
     return con
 
 def db_init():
@@ -55,6 +64,25 @@ def db_init():
         result TEXT,
         error TEXT
     )""")
+    cols = {r[1] for r in con.execute("PRAGMA table_info(jobs)")}
+    for col, decl in (("owner", "TEXT"), ("lease_until", "REAL")):
+        if col not in cols:
+            con.execute(f"ALTER TABLE jobs ADD COLUMN {col} {decl}")
+    # List indexes end in id: pages are keyed on (created_at, id) / (ts, id) so
+    # rows sharing a timestamp are neither skipped nor repeated across pages.
+    for old in ("idx_jobs_status_created", "idx_jobs_created", "idx_jobs_room_status",
+                "idx_audit_ts", "idx_audit_action_ts"):
+        con.execute(f"DROP INDEX IF EXISTS {old}")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created_id ON jobs(status, created_at, id)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_id ON jobs(created_at, id)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_room_status_id ON jobs(room, status, created_at, id)")
+    # kv_version is bumped by trigger on every kv write, from any process; the
+    # kv_get cache compares it to notice writes it did not make itself.
+    con.execute("CREATE TABLE IF NOT EXISTS kv_version (id INTEGER PRIMARY KEY CHECK (id = 1), v INTEGER NOT NULL)")
+    con.execute("INSERT OR IGNORE INTO kv_version(id, v) VALUES(1, 0)")
+    for ev in ("INSERT", "UPDATE", "DELETE"):
+        con.execute(f"CREATE TRIGGER IF NOT EXISTS kv_bump_{ev.lower()} AFTER {ev} ON kv "
+                    "BEGIN UPDATE kv_version SET v = v + 1 WHERE id = 1; END")
     con.execute("""CREATE TABLE IF NOT EXISTS audit (
         id TEXT PRIMARY KEY,
         ts REAL NOT NULL,
@@ -62,36 +90,172 @@ def db_init():
         action TEXT NOT NULL,
         data TEXT
     )""")
-    con.commit()
-    con.close()
+    con.execute("CREATE INDEX IF NOT EXISTS idx_audit_ts_id ON audit(ts, id)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_audit_action_ts_id ON audit(action, ts, id)")
 
 db_init()
 
-def audit(action: str, data: dict | None = None, actor: str = "local"):
+# ---------- Audit writer ----------
+AUDIT_FLUSH_MS = int(os.environ.get("STATION_AUDIT_FLUSH_MS", "200"))
+AUDIT_BATCH    = int(os.environ.get("STATION_AUDIT_BATCH", "500"))
+AUDIT_BACKOFF_MAX_SEC = float(os.environ.get("STATION_AUDIT_BACKOFF_MAX_SEC", "10"))
+_audit_q: queue.Queue = queue.Queue(maxsize=int(os.environ.get("STATION_AUDIT_QUEUE", "10000")))
+_audit_lock = threading.Lock()
+_audit_thread: Optional[threading.Thread] = None
+_audit_retry: list[tuple] = []  # batch whose write failed; goes out before anything newer
+_audit_stats = {"written": 0, "dropped": 0, "write_errors": 0}
+_audit_stats_lock = threading.Lock()  # not _audit_lock: that one is held across writes
+
+def _audit_write(rows: list[tuple]):
     con = db()
-    con.execute(
-        "INSERT INTO audit(id, ts, actor, action, data) VALUES(?,?,?,?,?)",
-        (str(uuid.uuid4()), _now(), actor, action, json.dumps(data or {}))
-    )
-    con.commit()
-    con.close()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        # OR IGNORE: a retried batch may have committed before the error surfaced.
+        con.executemany("INSERT OR IGNORE INTO audit(id, ts, actor, action, data) VALUES(?,?,?,?,?)", rows)
+        con.execute("COMMIT")
+    except Exception:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+
+def _audit_drain(block: bool) -> int:
+    with _audit_lock:
+        rows, _audit_retry[:] = list(_audit_retry), []
+    try:
+        if not rows:
+            rows.append(_audit_q.get(timeout=AUDIT_FLUSH_MS / 1000) if block else _audit_q.get_nowait())
+        while len(rows) < AUDIT_BATCH:
+            rows.append(_audit_q.get_nowait())
+    except queue.Empty:
+        pass
+    if rows:
+        with _audit_lock:
+            try:
+                _audit_write(rows)
+            except sqlite3.Error:
+                # Keep the batch at the front; rows are only lost to queue overflow.
+                _audit_retry[:0] = rows
+                with _audit_stats_lock:
+                    _audit_stats["write_errors"] += 1
+                raise
+        with _audit_stats_lock:
+            _audit_stats["written"] += len(rows)
+    return len(rows)
+
+def _audit_loop():
+    delay = AUDIT_FLUSH_MS / 1000
+    while True:
+        try:
+            _audit_drain(block=True)
+            delay = AUDIT_FLUSH_MS / 1000
+        except sqlite3.Error:
+            time.sleep(delay)
+            delay = min(delay * 2, AUDIT_BACKOFF_MAX_SEC)
+
+def audit_flush():
+    # Synchronously write whatever is queued (shutdown, tests, read-after-write).
+    while _audit_drain(block=False):
+        pass
+
+def audit_stats() -> dict:
+    with _audit_stats_lock:
+        return {**_audit_stats, "queued": _audit_q.qsize(), "retrying": len(_audit_retry)}
+
+def audit(action: str, data: dict | None = None, actor: str = "local"):
+    # Rows are written by a background thread in batches, off the request path.
+    global _audit_thread
+    if _audit_thread is None:
+        with _audit_lock:
+            if _audit_thread is None:
+                _audit_thread = threading.Thread(target=_audit_loop, name="audit-writer", daemon=True)
+                _audit_thread.start()
+                atexit.register(audit_flush)
+    try:
+        _audit_q.put_nowait((str(uuid.uuid4()), _now(), actor, action, json.dumps(data or {})))
+    except queue.Full:
+        # Writer is stuck (DB locked for long): shed rows rather than block requests.
+        with _audit_stats_lock:
+            _audit_stats["dropped"] += 1
+
+# ---------- KV cache ----------
+KV_CACHE_MAX  = int(os.environ.get("STATION_KV_CACHE_MAX", "1024"))
+KV_CHECK_SEC  = float(os.environ.get("STATION_KV_CHECK_MS", "500")) / 1000
+_kv_lock = threading.Lock()
+_kv_cache: "collections.OrderedDict[str, Any]" = collections.OrderedDict()
+# gen: bumped under _kv_lock by every local write and invalidation; a miss
+# only caches what it read if gen did not move while it was reading.
+_kv_state = {"version": None, "checked": 0.0, "gen": 0}
+_kv_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_MISSING = object()  # not in the cache
+_ABSENT = object()   # cached: no row for the key
+
+def _kv_version(con) -> int:
+    return con.execute("SELECT v FROM kv_version WHERE id=1").fetchone()[0]
+
+def _kv_check(con):
+    # At most every KV_CHECK_SEC: drop the cache if kv changed underneath us
+    # (another process, or a write this process did not route through kv_set).
+    t = _now()
+    if t - _kv_state["checked"] < KV_CHECK_SEC:
+        return
+    v = _kv_version(con)
+    with _kv_lock:
+        if v != _kv_state["version"]:
+            if _kv_cache:
+                _kv_stats["invalidations"] += 1
+            _kv_cache.clear()
+            _kv_state["version"] = v
+            _kv_state["gen"] += 1
+        _kv_state["checked"] = t
 
 def kv_get(k: str, default=None):
+    """Read-through LRU over the kv table. Values are returned already decoded
+    and shared between callers, so treat them as read-only."""
     con = db()
-    cur = con.execute("SELECT v FROM kv WHERE k=?", (k,))
-    row = cur.fetchone()
-    con.close()
-    return json.loads(row[0]) if row else default
+    _kv_check(con)
+    with _kv_lock:
+        v = _kv_cache.get(k, _MISSING)
+        if v is not _MISSING:
+            _kv_cache.move_to_end(k)
+            _kv_stats["hits"] += 1
+            return default if v is _ABSENT else v
+        _kv_stats["misses"] += 1
+        gen = _kv_state["gen"]
+    row = con.execute("SELECT v FROM kv WHERE k=?", (k,)).fetchone()
+    v = json.loads(row[0]) if row else _ABSENT
+    with _kv_lock:
+        if _kv_state["gen"] == gen:  # else a write raced the SELECT: v may be stale
+            _kv_cache[k] = v  # _ABSENT caches "no row"; a stored JSON null stays None
+            if len(_kv_cache) > KV_CACHE_MAX:
+                _kv_cache.popitem(last=False)
+    return default if v is _ABSENT else v
 
 def kv_set(k: str, v: Any):
     con = db()
-    con.execute(
-        "INSERT INTO kv(k,v,updated_at) VALUES(?,?,?) "
-        "ON CONFLICT(k) DO UPDATE SET v=excluded.v, updated_at=excluded.updated_at",
-        (k, json.dumps(v), _now())
-    )
-    con.commit()
-    con.close()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        before = _kv_version(con)
+        con.execute(
+            "INSERT INTO kv(k,v,updated_at) VALUES(?,?,?) "
+            "ON CONFLICT(k) DO UPDATE SET v=excluded.v, updated_at=excluded.updated_at",
+            (k, json.dumps(v), _now())
+        )
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    with _kv_lock:
+        _kv_cache.pop(k, None)
+        _kv_state["gen"] += 1
+        # Only our own bump happened since the cache was last validated: keep it.
+        if _kv_state["version"] == before:
+            _kv_state["version"] = before + 1
+
+def kv_cache_stats() -> dict:
+    with _kv_lock:
+        total = _kv_stats["hits"] + _kv_stats["misses"]
+        return {**_kv_stats, "size": len(_kv_cache), "max": KV_CACHE_MAX,
+                "hit_rate": round(_kv_stats["hits"] / total, 4) if total else None}
 
 def job_create(room: str, payload: dict):
     jid = str(uuid.uuid4())
@@ -100,8 +264,6 @@ def job_create(room: str, payload: dict):
         "INSERT INTO jobs(id,room,status,created_at,updated_at,payload) VALUES(?,?,?,?,?,?)",
         (jid, room, "queued", _now(), _now(), json.dumps(payload))
     )
-    con.commit()
-    con.close()
     return jid
 
 def job_update(jid: str, **fields):
@@ -121,14 +283,11 @@ def job_update(jid: str, **fields):
     vals.append(jid)
     con = db()
     con.execute(f"UPDATE jobs SET {', '.join(sets)} WHERE id=?", tuple(vals))
-    con.commit()
-    con.close()
 
 def job_get(jid: str):
     con = db()
     cur = con.execute("SELECT id,room,status,created_at,updated_at,payload,result,error FROM jobs WHERE id=?", (jid,))
     row = cur.fetchone()
-    con.close()
     if not row:
         return None
     return {
@@ -139,21 +298,107 @@ def job_get(jid: str):
         "error": row[7],
     }
 
-def jobs_list(limit: int = 50):
+def job_claim(owner: str, lease_sec: float, caps: dict[str, int],
+              skip: set[str], only: Optional[set[str]] = None):
+    """Atomically move the oldest eligible queued job to running under `owner`.
+    Room caps are checked against running rows in the DB, so they hold across
+    every process sharing station.db."""
     con = db()
-    cur = con.execute("SELECT id,room,status,created_at,updated_at FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
-    rows = cur.fetchall()
-    con.close()
-    return [{"id":r[0],"room":r[1],"status":r[2],"created_at":r[3],"updated_at":r[4]} for r in rows]
-
-# ---------- Helpers ----------
-def _cmd(s: str) -> str:
     try:
-        out = subprocess.check_output(s, shell=True, stderr=subprocess.STDOUT, timeout=8)
-        return out.decode("utf-8","ignore").strip()
+        con.execute("BEGIN IMMEDIATE")
+        busy = dict(con.execute("SELECT room, COUNT(*) FROM jobs WHERE status='running' GROUP BY room"))
+        skip = set(skip) | {r for r, c in caps.items() if busy.get(r, 0) >= c}
+        q, args = "SELECT id, room, payload FROM jobs WHERE status='queued'", []
+        if skip:
+            q += f" AND room NOT IN ({','.join('?' * len(skip))})"
+            args += sorted(skip)
+        if only is not None:
+            q += f" AND room IN ({','.join('?' * len(only))})"
+            args += sorted(only)
+        row = con.execute(q + " ORDER BY created_at LIMIT 1", args).fetchone()
+        if row:
+            t = _now()
+            con.execute(
+                "UPDATE jobs SET status='running', owner=?, lease_until=?, updated_at=? WHERE id=?",
+                (owner, t + lease_sec, t, row[0])
+            )
+        con.execute("COMMIT")
     except Exception:
-        return ""
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    if not row:
+        return None
+    return row[0], row[1], (json.loads(row[2]) if row[2] else {})
+
+def job_renew(owner: str, lease_sec: float, exclude: set[str] = frozenset()):
+    # `exclude`: jobs this owner gave up on; their lease runs out and the reaper fails them.
+    q, args = "UPDATE jobs SET lease_until=? WHERE status='running' AND owner=?", [_now() + lease_sec, owner]
+    if exclude:
+        q += f" AND id NOT IN ({','.join('?' * len(exclude))})"
+        args += sorted(exclude)
+    db().execute(q, args)
+
+def jobs_reap_orphans() -> int:
+    # Running rows whose worker stopped renewing (crash/restart). Rooms are not
+    # guaranteed idempotent, so they are failed rather than re-run.
+    t = _now()
+    con = db()
+    cur = con.execute(
+        "UPDATE jobs SET status='failed', error='orphaned: worker lease expired', updated_at=? "
+        "WHERE status='running' AND (lease_until IS NULL OR lease_until < ?)", (t, t)
+    )
+    return cur.rowcount
+
+def jobs_queued() -> int:
+    con = db()
+    n = con.execute("SELECT COUNT(*) FROM jobs WHERE status='queued'").fetchone()[0]
+    return n
 
+def _before(col: str, before_ts: Optional[float], before_id: Optional[str], where: list, args: list):
+    # Keyset cursor (col, id), newest first. A bare before_ts still works but
+    # cannot split a run of rows that share one timestamp.
+    if before_ts is None:
+        return
+    if before_id is None:
+        where.append(f"{col} < ?"); args.append(before_ts)
+    else:
+        where.append(f"({col}, id) < (?, ?)"); args += [before_ts, before_id]  # row value: stays an index range
+
+def jobs_list(limit: int = 50, before_ts: Optional[float] = None,
+              room: Optional[str] = None, status: Optional[str] = None,
+              before_id: Optional[str] = None):
+    # Keyset pagination: pass the last row's created_at and id as before_ts/before_id.
+    where, args = [], []
+    _before("created_at", before_ts, before_id, where, args)
+    if room:
+        where.append("room = ?"); args.append(room)
+    if status:
+        where.append("status = ?"); args.append(status)
+    q = "SELECT id,room,status,created_at,updated_at FROM jobs"
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    rows = db().execute(q + " ORDER BY created_at DESC, id DESC LIMIT ?", (*args, limit)).fetchall()
+    return [{"id":r[0],"room":r[1],"status":r[2],"created_at":r[3],"updated_at":r[4]} for r in rows]
+
+def audit_list(limit: int = 100, before_ts: Optional[float] = None, since_ts: Optional[float] = None,
+               action: Optional[str] = None, actor: Optional[str] = None, before_id: Optional[str] = None):
+    audit_flush()
+    where, args = [], []
+    _before("ts", before_ts, before_id, where, args)
+    if since_ts is not None:
+        where.append("ts >= ?"); args.append(since_ts)
+    if action:
+        where.append("action = ?"); args.append(action)
+    if actor:
+        where.append("actor = ?"); args.append(actor)
+    q = "SELECT id,ts,actor,action,data FROM audit"
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    rows = db().execute(q + " ORDER BY ts DESC, id DESC LIMIT ?", (*args, limit)).fetchall()
+    return [{"id":r[0],"ts":r[1],"actor":r[2],"action":r[3],"data":json.loads(r[4]) if r[4] else {}} for r in rows]
+
+# ---------- Helpers ----------
 def _safe_path(p: str) -> pathlib.Path:
     base = pathlib.Path(ROOT).resolve()
     tgt  = (base / p).resolve()
@@ -184,18 +429,11 @@ class Kernel:
 
 kernel = Kernel()
 
-def room_doctor(_):
-    return {
-        "status":"ok",
-        "mode":"termux-safe",
-        "python": _cmd("python -V"),
-        "node": _cmd("node -v"),
-        "npm": _cmd("npm -v"),
-        "git": _cmd("git --version"),
-        "platform": platform.platform(),
-        "root": ROOT,
-        "db": DB_PATH
-    }
+def room_doctor(payload):
+    # Probes run concurrently and are cached; {"refresh": true} forces a re-run.
+    out = rooms_doctor.doctor(payload)
+    out.update({"root": ROOT, "db": DB_PATH})
+    return out
 
 def room_rooms_list(_):
     return {"rooms": sorted(kernel.rooms)}
@@ -208,7 +446,19 @@ def room_fs(payload):
         return {"path": str(tgt), "files": [p.name for p in tgt.iterdir()]}
     if action == "read":
         if not tgt.exists(): return {"error":"not found"}
-        return {"path": str(tgt), "content": tgt.read_text(errors="ignore")[:200000]}
+        # Ranged text read; large files should go through GET /ops/fs/download.
+        try:
+            offset, length = int(payload.get("offset", 0)), min(int(payload.get("length", 200000)), 200000)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="offset and length must be integers")
+        if offset < 0 or length < 0:
+            # f.seek() raises on a negative offset; f.read(-1) would read the whole file.
+            raise HTTPException(status_code=400, detail="offset and length must be >= 0")
+        with open(tgt, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        return {"path": str(tgt), "content": data.decode("utf-8", "ignore"), "offset": offset,
+                "size": tgt.stat().st_size}
     if action == "write":
         content = payload.get("content","")
         tgt.parent.mkdir(parents=True, exist_ok=True)
@@ -224,25 +474,50 @@ def room_env(payload):
             out[k] = ("set" if os.environ.get(k) else None)
     return out
 
-def room_snapshot(_):
-    snap_dir = pathlib.Path(ROOT) / "snapshots"
-    snap_dir.mkdir(exist_ok=True)
-    name = f"snapshot_{int(time.time())}.tgz"
-    f = snap_dir / name
-    with tarfile.open(f, "w:gz") as tar:
-        tar.add(ROOT, arcname="station_root")
-    audit("snapshot", {"file": str(f)})
-    return {"snapshot": str(f)}
+SNAP_DIR = pathlib.Path(ROOT) / "snapshots"
+SNAP_STORE = SNAP_DIR / "store"
+SNAP_EXCLUDE = [e for e in os.environ.get("STATION_SNAPSHOT_EXCLUDE", "snapshots,state/station.db-wal,state/station.db-shm").split(",") if e]
+
+def room_snapshot(payload):
+    # Incremental: unchanged files (size+mtime) reuse the previous manifest's chunks.
+    if payload.get("action") == "list":
+        return {"snapshots": snapshot_store.list_snapshots(str(SNAP_STORE))}
+    # station.db is live and in WAL mode: copying the file would miss every
+    # commit still in the -wal (excluded) and could tear under a checkpoint,
+    # so the snapshot stores an online backup of it instead.
+    staging = SNAP_DIR / "staging"
+    staging.mkdir(parents=True, exist_ok=True)
+    db_copy = staging / f"station.db.{uuid.uuid4().hex[:8]}"
+    try:
+        src, dst = sqlite3.connect(DB_PATH), sqlite3.connect(str(db_copy))
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        db_rel = os.path.relpath(DB_PATH, ROOT)
+        res = snapshot_store.snapshot(ROOT, str(SNAP_STORE), exclude=SNAP_EXCLUDE, sources={db_rel: str(db_copy)})
+    finally:
+        db_copy.unlink(missing_ok=True)
+    if payload.get("keep"):
+        res["gc"] = snapshot_store.gc(str(SNAP_STORE), int(payload["keep"]))
+    audit("snapshot", {"snapshot": res["snapshot"], "stats": res["stats"]})
+    return res
 
 def room_restore(payload):
     f = payload.get("file")
-    if not f: return {"error":"file required"}
-    fp = pathlib.Path(f)
-    if not fp.exists(): return {"error":"not found"}
-    with tarfile.open(fp, "r:gz") as tar:
-        tar.extractall(path=pathlib.Path(ROOT).parent)
-    audit("restore", {"file": str(fp)})
-    return {"restored": str(fp)}
+    if f:
+        # Legacy full-tree .tgz from before the chunk store.
+        fp = pathlib.Path(f)
+        if not fp.exists(): return {"error":"not found"}
+        with tarfile.open(fp, "r:gz") as tar:
+            tar.extractall(path=pathlib.Path(ROOT).parent)
+        audit("restore", {"file": str(fp)})
+        return {"restored": str(fp)}
+    res = snapshot_store.restore(ROOT, str(SNAP_STORE), payload.get("snapshot"), payload.get("paths"))
+    if "error" not in res:
+        audit("restore", {"snapshot": res["snapshot"], "paths": res["paths"]})
+    return res
 
 kernel.register("doctor", room_doctor)
 kernel.register("rooms_list", room_rooms_list)
@@ -252,30 +527,445 @@ kernel.register("snapshot", room_snapshot)
 kernel.register("restore", room_restore)
 
 # ---------- Jobs ----------
-def _run_job(jid: str, room: str, payload: dict):
-    try:
-        job_update(jid, status="running")
-        res = kernel.run(room, payload)
-        job_update(jid, status="done", result=res)
-    except Exception as e:
-        job_update(jid, status="failed", error=str(e))
+def _env_caps(name: str, default: str) -> dict[str, int]:
+    # "snapshot=1,fs=4" -> {"snapshot": 1, "fs": 4}
+    out = {}
+    for kv in os.environ.get(name, default).split(","):
+        if "=" in kv:
+            k, v = kv.split("=", 1)
+            out[k.strip()] = int(v)
+    return out
+
+JOB_THREADS = int(os.environ.get("STATION_JOB_THREADS", "4"))
+JOB_PROCS   = int(os.environ.get("STATION_JOB_PROCS", str(min(2, os.cpu_count() or 1))))
+JOB_BACKLOG = int(os.environ.get("STATION_JOB_BACKLOG", "64"))
+JOB_LEASE_SEC = float(os.environ.get("STATION_JOB_LEASE_SEC", "60"))
+JOB_POLL_SEC  = float(os.environ.get("STATION_JOB_POLL_SEC", "1"))
+JOB_FINISH_TRIES = int(os.environ.get("STATION_JOB_FINISH_TRIES", "5"))
+JOB_WORKER  = os.environ.get("STATION_JOB_WORKER", "1") != "0"
+CPU_ROOMS   = set(filter(None, os.environ.get("STATION_CPU_ROOMS", "snapshot,restore").split(",")))
+ROOM_CAPS   = _env_caps("STATION_ROOM_CAPS", "snapshot=1,restore=1")
+RUN_WAIT_SEC = float(os.environ.get("STATION_RUN_WAIT_SEC", "600"))
+
+def _exec_room(room: str, payload: dict):
+    # Module-level so ProcessPoolExecutor can pickle it by name.
+    return kernel.run(room, payload)
+
+class JobPool:
+    """Worker loop over the jobs table: claims queued rows under a lease and runs
+    them on a thread pool (I/O rooms) or a process pool (CPU_ROOMS). Any number
+    of processes can run a JobPool against the same station.db."""
+    def __init__(self, threads: int, procs: int, backlog: int, caps: dict[str, int]):
+        self.owner = f"{platform.node()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.running: dict[str, int] = {}
+        self.abandoned: set[str] = set()
+        self.size = {"thread": max(1, threads), "proc": max(0, procs)}
+        self.busy = {"thread": 0, "proc": 0}
+        self.backlog = backlog
+        self.caps = caps
+        self.stats = {"claimed": 0, "done": 0, "failed": 0, "rejected": 0, "orphaned": 0, "abandoned": 0}
+        self.threads = ThreadPoolExecutor(max_workers=self.size["thread"], thread_name_prefix="job")
+        self.procs: Optional[ProcessPoolExecutor] = None
+
+    def _kind(self, room: str) -> str:
+        if room not in CPU_ROOMS or self.size["proc"] == 0:
+            return "thread"
+        if self.procs is None:
+            try:
+                self.procs = ProcessPoolExecutor(max_workers=self.size["proc"], mp_context=multiprocessing.get_context("spawn"))
+            except Exception:
+                # No working sem_open (e.g. Termux): CPU rooms share the thread pool.
+                self.size["proc"] = 0
+                return "thread"
+        return "proc"
+
+    def has_room(self) -> bool:
+        if jobs_queued() < self.backlog:
+            return True
+        with self.lock:
+            self.stats["rejected"] += 1
+        return False
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        n = jobs_reap_orphans()
+        if n:
+            self.stats["orphaned"] += n
+            audit("jobs_recover", {"orphaned": n, "owner": self.owner})
+        self.stop.clear()
+        self.thread = threading.Thread(target=self._loop, name="job-worker", daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        self.stop.set()
+        self.wake.set()
+
+    def _loop(self):
+        last_renew = _now()
+        while not self.stop.is_set():
+            self.wake.clear()
+            try:
+                if _now() - last_renew >= JOB_LEASE_SEC / 3:
+                    with self.lock:
+                        abandoned = set(self.abandoned)
+                    job_renew(self.owner, JOB_LEASE_SEC, abandoned)
+                    n = jobs_reap_orphans()
+                    if abandoned:
+                        still = {r[0] for r in db().execute(
+                            f"SELECT id FROM jobs WHERE status='running' AND id IN ({','.join('?' * len(abandoned))})",
+                            sorted(abandoned))}
+                        with self.lock:
+                            self.abandoned -= abandoned - still
+                    with self.lock:
+                        self.stats["orphaned"] += n
+                    last_renew = _now()
+                self._fill()
+            except sqlite3.Error:
+                pass  # locked/busy: retry next tick
+            # Short poll so jobs enqueued by other processes are picked up.
+            self.wake.wait(JOB_POLL_SEC)
+
+    def _filters(self):
+        with self.lock:
+            thread_full = self.busy["thread"] >= self.size["thread"]
+            proc_full = self.size["proc"] > 0 and self.busy["proc"] >= self.size["proc"]
+        if self.size["proc"] == 0:
+            return (None, None) if thread_full else (set(), None)
+        if thread_full and proc_full:
+            return None, None
+        if thread_full:
+            return set(), set(CPU_ROOMS)
+        return (set(CPU_ROOMS) if proc_full else set()), None
+
+    def _fill(self):
+        while not self.stop.is_set():
+            skip, only = self._filters()
+            if skip is None:
+                return
+            got = job_claim(self.owner, JOB_LEASE_SEC, self.caps, skip, only)
+            if not got:
+                return
+            jid, room, payload = got
+            kind = self._kind(room)
+            with self.lock:
+                self.busy[kind] += 1
+                self.running[room] = self.running.get(room, 0) + 1
+                self.stats["claimed"] += 1
+            ex = self.procs if kind == "proc" else self.threads
+            try:
+                fut = ex.submit(_exec_room, room, payload)
+            except RuntimeError as e:  # executor shut down (interpreter exit)
+                self._finish(jid, room, kind, None, str(e))
+                return
+            fut.add_done_callback(lambda f, jid=jid, room=room, kind=kind: self._done(jid, room, kind, f))
+
+    def _done(self, jid: str, room: str, kind: str, fut):
+        try:
+            result, error = fut.result(), None
+        except BrokenProcessPool as e:
+            # A crashed child poisons the whole pool; route CPU rooms to threads from now on.
+            self.size["proc"] = 0
+            result, error = None, str(e)
+        except Exception as e:
+            result, error = None, str(e)
+        self._finish(jid, room, kind, result, error)
+
+    def _finish(self, jid: str, room: str, kind: str, result, error):
+        # The final write is retried; if it never lands, stop renewing the job
+        # so its lease expires and the reaper fails it instead of it staying
+        # "running" for as long as this process lives.
+        try:
+            for attempt in range(JOB_FINISH_TRIES):
+                try:
+                    if error is None:
+                        job_update(jid, status="done", result=result)
+                    else:
+                        job_update(jid, status="failed", error=error)
+                    break
+                except sqlite3.Error:
+                    if attempt == JOB_FINISH_TRIES - 1:
+                        with self.lock:
+                            self.abandoned.add(jid)
+                            self.stats["abandoned"] += 1
+                    else:
+                        time.sleep(min(0.1 * 2 ** attempt, 2))
+        finally:
+            with self.lock:
+                self.busy[kind] -= 1
+                self.running[room] -= 1
+                self.stats["done" if error is None else "failed"] += 1
+            self.wake.set()
+            _job_finished(jid)
+
+    def metrics(self) -> dict:
+        with self.lock:
+            out = {
+                "owner": self.owner,
+                "worker": bool(self.thread and self.thread.is_alive()),
+                "backlog_limit": self.backlog,
+                "running": {k: v for k, v in self.running.items() if v},
+                "busy": dict(self.busy),
+                "workers": dict(self.size),
+                "room_caps": dict(self.caps),
+                **self.stats,
+            }
+        out["pending"] = jobs_queued()
+        return out
+
+pool = JobPool(JOB_THREADS, JOB_PROCS, JOB_BACKLOG, ROOM_CAPS)
 
 def enqueue(room: str, payload: dict):
+    if not pool.has_room():
+        raise HTTPException(status_code=429, detail="job backlog full")
     jid = job_create(room, payload)
-    t = threading.Thread(target=_run_job, args=(jid, room, payload), daemon=True)
-    t.start()
+    pool.wake.set()
     return jid
 
+_job_waiters: dict[str, tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+_job_waiters_lock = threading.Lock()
+
+def _job_finished(jid: str):
+    # Called by JobPool._finish on a worker thread; wakes an awaiting run_via_pool.
+    with _job_waiters_lock:
+        w = _job_waiters.get(jid)
+    if w is not None:
+        loop, fut = w
+        try:
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(None))
+        except RuntimeError:
+            pass  # loop already closed
+
+async def run_via_pool(room: str, payload: dict):
+    """Run a capped room as a job, so ROOM_CAPS also covers /ops/run, and
+    await it without holding a threadpool thread. Returns the room's result,
+    or {"job_id", "status"} if it is still going after RUN_WAIT_SEC (poll
+    /ops/jobs/{id}). Raises 429 like /ops/enqueue when the backlog is full."""
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    jid = await run_in_threadpool(enqueue, room, payload)
+    with _job_waiters_lock:
+        _job_waiters[jid] = (loop, fut)
+    try:
+        deadline = loop.time() + RUN_WAIT_SEC
+        while True:
+            j = await run_in_threadpool(job_get, jid)
+            if j["status"] == "done":
+                return j["result"]
+            if j["status"] == "failed":
+                raise HTTPException(status_code=500, detail={"job_id": jid, "error": j["error"]})
+            left = deadline - loop.time()
+            if left <= 0:
+                return {"job_id": jid, "status": j["status"]}
+            # Woken by the local pool; the timeout catches jobs another process ran.
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), min(left, JOB_POLL_SEC))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        with _job_waiters_lock:
+            _job_waiters.pop(jid, None)
+
+# ---------- Log tail ----------
+TAIL_BLOCK    = 64 * 1024
+TAIL_SCAN_MAX = int(os.environ.get("STATION_TAIL_SCAN_MAX", str(64 * 1024 * 1024)))
+FOLLOW_POLL_SEC = float(os.environ.get("STATION_TAIL_POLL_SEC", "0.5"))
+FOLLOW_READ_MAX = 1024 * 1024
+
+def _log_path(file: str) -> pathlib.Path:
+    p = (LOGS_DIR / file).resolve()
+    if LOGS_DIR not in p.parents and p != LOGS_DIR:
+        raise HTTPException(status_code=400, detail="forbidden log path")
+    return p
+
+def _grep(pattern: Optional[str]):
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"bad grep pattern: {e}")
+
+def tail_lines(p: pathlib.Path, n: int, rx=None, before: Optional[int] = None):
+    """Last n complete lines ending at or before byte offset `before` (default:
+    EOF), read backwards in blocks. Returns (lines, start, end): `start` is the
+    cursor for the previous page, `end` the offset to resume/follow from."""
+    out: list[str] = []
+    with open(p, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size if before is None else max(0, min(before, size))
+        pos, carry, trailing, start = end, b"", True, end
+        while pos > 0 and len(out) < n and end - pos < TAIL_SCAN_MAX:
+            step = min(TAIL_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + carry
+            idx = len(data)
+            while len(out) < n:
+                nl = data.rfind(b"\n", 0, idx)
+                if nl < 0:
+                    break
+                seg_start = pos + nl + 1
+                if trailing:
+                    # Bytes after the last newline are a line still being written.
+                    trailing, end = False, seg_start
+                else:
+                    line = data[nl + 1:idx].decode("utf-8", "ignore").rstrip("\r")
+                    if rx is None or rx.search(line):
+                        out.append(line)
+                    start = seg_start
+                idx = nl
+            carry = data[:idx]
+        if trailing and pos == 0:
+            end = start = 0  # no complete line at all
+        elif pos == 0 and len(out) < n and end - pos < TAIL_SCAN_MAX:
+            line = carry.decode("utf-8", "ignore").rstrip("\r")
+            if rx is None or rx.search(line):
+                out.append(line)
+            start = 0
+    out.reverse()
+    return out, start, end
+
+def read_lines_from(p: pathlib.Path, offset: int, n: int, rx=None):
+    """Complete lines starting at byte offset; returns (lines, next_offset)."""
+    out: list[str] = []
+    with open(p, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if offset > size:
+            offset = 0  # truncated/rotated since the cursor was issued
+        f.seek(offset)
+        while len(out) < n:
+            raw = f.readline()
+            if not raw.endswith(b"\n"):
+                break
+            offset += len(raw)
+            line = raw[:-1].decode("utf-8", "ignore").rstrip("\r")
+            if rx is None or rx.search(line):
+                out.append(line)
+    return out, offset
+
+async def follow_lines(request: Request, p: pathlib.Path, offset: int, rx=None):
+    # SSE: one event per line, id = byte offset just past it, so a reconnect
+    # with Last-Event-ID (or ?offset=) resumes exactly where the client stopped.
+    f, last_beat = None, time.time()
+    try:
+        while not await request.is_disconnected():
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                st = None
+            if st is not None and (f is None or os.fstat(f.fileno()).st_ino != st.st_ino or st.st_size < offset):
+                if f is not None or st.st_size < offset:
+                    # Rotated or truncated, now or since the resume cursor was issued.
+                    offset = 0
+                    yield "event: reset\ndata: {}\n\n"
+                if f is not None:
+                    f.close()
+                f = open(p, "rb")
+            if f is not None and st is not None and st.st_size > offset:
+                f.seek(offset)
+                data = f.read(min(st.st_size - offset, FOLLOW_READ_MAX))
+                nl = data.rfind(b"\n")
+                if nl < 0 and len(data) == FOLLOW_READ_MAX:
+                    nl = len(data) - 1  # pathological line longer than a read
+                if nl >= 0:
+                    for raw in data[:nl + 1].splitlines(keepends=True):
+                        offset += len(raw)
+                        line = raw.rstrip(b"\r\n").decode("utf-8", "ignore")
+                        if rx is None or rx.search(line):
+                            yield f"id: {offset}\ndata: {line}\n\n"
+                    last_beat = time.time()
+                    continue
+            if time.time() - last_beat >= 15:
+                yield ": keepalive\n\n"
+                last_beat = time.time()
+            await asyncio.sleep(FOLLOW_POLL_SEC)
+    finally:
+        if f is not None:
+            f.close()
+
+# ---------- File streaming ----------
+FS_CHUNK = 1024 * 1024
+FS_LIST_MAX = 1000
+
+def _parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    # Single "bytes=a-b" / "bytes=a-" / "bytes=-n"; returns inclusive (start, end).
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise HTTPException(status_code=416, detail="only a single bytes range is supported",
+                            headers={"Content-Range": f"bytes */{size}"})
+    a, _, b = spec.strip().partition("-")
+    try:
+        if a == "":
+            start, end = max(0, size - int(b)), size - 1
+        else:
+            start, end = int(a), (min(int(b), size - 1) if b else size - 1)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="bad range", headers={"Content-Range": f"bytes */{size}"})
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def _iter_file(p: pathlib.Path, start: int, end: int):
+    # mmap keeps the file out of the Python heap; each yield copies one chunk.
+    # (uvicorn exposes no zero-copy send extension, so true sendfile is not available.)
+    with open(p, "rb") as f:
+        if end < start:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            while pos <= end:
+                nxt = min(pos + FS_CHUNK, end + 1)
+                yield mm[pos:nxt]
+                pos = nxt
+
+def fs_list(d: pathlib.Path, after: Optional[str], limit: int):
+    entries = []
+    with os.scandir(d) as it:
+        for e in it:
+            if after is not None and e.name <= after:
+                continue
+            entries.append(e)
+    entries.sort(key=lambda e: e.name)
+    page = []
+    for e in entries[:limit]:
+        try:
+            st = e.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        kind = "dir" if stat.S_ISDIR(st.st_mode) else "link" if stat.S_ISLNK(st.st_mode) else "file"
+        page.append({"name": e.name, "type": kind, "size": st.st_size, "mtime": st.st_mtime})
+    return page, (page[-1]["name"] if len(entries) > limit and page else None)
+
 # ---------- FastAPI (Factory API) ----------
 app = FastAPI(title="Station Factory Kernel", version="1.1.0")
 
+@app.on_event("startup")
+def _jobs_startup():
+    # Started here rather than at import so process-pool children (which
+    # import this module) never run a worker loop of their own.
+    if JOB_WORKER:
+        pool.start()
+    rooms_doctor.start_refresher()
+
+@app.on_event("shutdown")
+def _jobs_shutdown():
+    pool.shutdown()
+    audit_flush()
+
 @app.get("/__whoami")
 def whoami():
     return {"asgi_file": ASGI_FILE, "asgi_hash": ASGI_HASH, "rooms": sorted(kernel.rooms)}
 
 @app.get("/healthz")
 def healthz():
-    return {"ok": True, "entry": "asgi.factory", "rooms": len(kernel.rooms), "db": True, "hash": ASGI_HASH}
+    return {"ok": True, "entry": "asgi.factory", "rooms": len(kernel.rooms), "db": True, "hash": ASGI_HASH, "jobs": pool.metrics(), "kv_cache": kv_cache_stats(), "audit": audit_stats()}
 
 @app.get("/info")
 def info():
@@ -285,12 +975,18 @@ def info():
 def ops_rooms():
     return {"rooms": sorted(kernel.rooms)}
 
-@app.post("/ops/run/{room}")
-def ops_run(room: str, payload: dict | None = None, x_edit_key: str | None = Header(None)):
+@app.post("/ops/run/{room}", responses={429: {"description": "rate limited, or the job backlog is full (capped rooms)"}})
+async def ops_run(room: str, payload: dict | None = None, x_edit_key: str | None = Header(None)):
+    """Run a room and return its result. Capped rooms (STATION_ROOM_CAPS,
+    snapshot/restore by default) go through the job queue, so they answer 429
+    "job backlog full" when STATION_JOB_BACKLOG jobs are already queued."""
     guard(x_edit_key)
-    rate_limit(x_edit_key or "none")
+    await run_in_threadpool(rate_limit, x_edit_key or "none")  # may hit the shared SQLite limiter
     audit("ops_run", {"room": room})
-    return kernel.run(room, payload or {})
+    payload = payload or {}
+    if room in ROOM_CAPS and payload.get("action") != "list":
+        return await run_via_pool(room, payload)
+    return await run_in_threadpool(kernel.run, room, payload)
 
 @app.post("/ops/enqueue/{room}")
 def ops_enqueue(room: str, payload: dict | None = None, x_edit_key: str | None = Header(None)):
@@ -300,10 +996,27 @@ def ops_enqueue(room: str, payload: dict | None = None, x_edit_key: str | None =
     audit("ops_enqueue", {"room": room, "job": jid})
     return {"job_id": jid}
 
+def _next_page(rows: list, limit: int, col: str) -> dict:
+    # A short page is the last one: no cursor, so clients stop without an extra empty fetch.
+    last = rows[-1] if len(rows) == limit else None
+    return {"next_before_ts": last[col] if last else None, "next_before_id": last["id"] if last else None}
+
 @app.get("/ops/jobs")
-def ops_jobs(limit: int = 50, x_edit_key: str | None = Header(None)):
+def ops_jobs(limit: int = 50, before_ts: float | None = None, before_id: str | None = None,
+             room: str | None = None, status: str | None = None, x_edit_key: str | None = Header(None)):
+    guard(x_edit_key)
+    limit = max(1, min(limit, 500))
+    jobs = jobs_list(limit, before_ts, room, status, before_id)
+    return {"jobs": jobs, **_next_page(jobs, limit, "created_at")}
+
+@app.get("/ops/audit")
+def ops_audit(limit: int = 100, before_ts: float | None = None, before_id: str | None = None,
+              since_ts: float | None = None, action: str | None = None, actor: str | None = None,
+              x_edit_key: str | None = Header(None)):
     guard(x_edit_key)
-    return {"jobs": jobs_list(limit)}
+    limit = max(1, min(limit, 500))
+    rows = audit_list(limit, before_ts, since_ts, action, actor, before_id)
+    return {"audit": rows, **_next_page(rows, limit, "ts")}
 
 @app.get("/ops/jobs/{job_id}")
 def ops_job(job_id: str, x_edit_key: str | None = Header(None)):
@@ -314,12 +1027,96 @@ def ops_job(job_id: str, x_edit_key: str | None = Header(None)):
     return j
 
 @app.get("/ops/logs/tail")
-def ops_logs_tail(file: str = "backend.log", n: int = 200, x_edit_key: str | None = Header(None)):
+def ops_logs_tail(request: Request, file: str = "backend.log", n: int = 200, grep: str | None = None,
+                  before: int | None = None, offset: int | None = None, follow: bool = False,
+                  x_edit_key: str | None = Header(None), last_event_id: str | None = Header(None)):
+    """Without follow: the last n lines (or n lines before `before`, or after
+    `offset`) plus byte cursors. With follow=true: SSE of the tail, then new
+    lines as they are appended."""
     guard(x_edit_key)
-    p = (LOGS_DIR / file).resolve()
-    if LOGS_DIR not in p.parents and p != LOGS_DIR:
-        raise HTTPException(status_code=400, detail="forbidden log path")
+    p = _log_path(file)
+    rx = _grep(grep)
+    n = max(1, min(n, 800))
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+    if follow:
+        async def stream():
+            start = offset
+            if start is None:
+                start = 0
+                if p.exists():
+                    lines, _, start = tail_lines(p, n, rx)
+                    for line in lines:
+                        yield f"data: {line}\n\n"
+                yield f"event: cursor\ndata: {start}\n\n"
+            async for ev in follow_lines(request, p, start, rx):
+                yield ev
+        return StreamingResponse(stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
     if not p.exists():
-        return {"file": str(p), "lines": []}
-    lines = p.read_text(errors="ignore").splitlines()[-max(1, min(n, 800)):]
-    return {"file": str(p), "lines": lines}
+        return {"file": str(p), "lines": [], "start": 0, "end": 0}
+    if offset is not None:
+        lines, end = read_lines_from(p, offset, n, rx)
+        return {"file": str(p), "lines": lines, "start": offset, "end": end}
+    lines, start, end = tail_lines(p, n, rx, before)
+    return {"file": str(p), "lines": lines, "start": start, "end": end}
+
+@app.get("/ops/fs/list")
+def ops_fs_list(path: str = "", after: str | None = None, limit: int = 200, x_edit_key: str | None = Header(None)):
+    guard(x_edit_key)
+    d = _safe_path(path)
+    if not d.is_dir():
+        raise HTTPException(status_code=404, detail="not a directory")
+    entries, next_after = fs_list(d, after, max(1, min(limit, FS_LIST_MAX)))
+    return {"path": str(d), "entries": entries, "next_after": next_after}
+
+@app.get("/ops/fs/download")
+def ops_fs_download(path: str, range_header: str | None = Header(None, alias="range"), x_edit_key: str | None = Header(None)):
+    guard(x_edit_key)
+    p = _safe_path(path)
+    if not p.is_file():
+        raise HTTPException(status_code=404, detail="not found")
+    st = p.stat()
+    rng = _parse_range(range_header, st.st_size)
+    start, end = rng if rng else (0, st.st_size - 1)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Last-Modified": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(st.st_mtime)),
+        "ETag": f'"{st.st_size:x}-{st.st_mtime_ns:x}"',
+        "Content-Disposition": f'attachment; filename="{p.name}"',
+    }
+    if rng:
+        headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    return StreamingResponse(_iter_file(p, start, end), status_code=206 if rng else 200,
+                             media_type="application/octet-stream", headers=headers)
+
+@app.put("/ops/fs/upload")
+async def ops_fs_upload(request: Request, path: str, offset: int = 0, final: bool = True,
+                        x_edit_key: str | None = Header(None)):
+    """Chunked, resumable upload. Bytes go to <path>.part; offset must equal its
+    current size (0 restarts). final=true renames the part file into place."""
+    guard(x_edit_key)
+    tgt, base = _safe_path(path), pathlib.Path(ROOT).resolve()
+    # The root itself (path="") or a directory cannot be a target, and the
+    # .part file must sit next to it inside the root.
+    if tgt == base or tgt.is_dir() or (tgt.parent != base and base not in tgt.parent.parents):
+        raise HTTPException(status_code=400, detail="upload path must name a file under the root")
+    part = tgt.parent / (tgt.name + ".part")
+    tgt.parent.mkdir(parents=True, exist_ok=True)
+    have = part.stat().st_size if part.exists() else 0
+    if offset not in (0, have):
+        raise HTTPException(status_code=409, detail={"error": "offset mismatch", "size": have})
+    written = 0
+    with open(part, "r+b" if offset and part.exists() else "wb") as f:
+        f.seek(offset)
+        async for chunk in request.stream():
+            if chunk:
+                await asyncio.to_thread(f.write, chunk)
+                written += len(chunk)
+        f.truncate()
+    size = offset + written
+    if final:
+        os.replace(part, tgt)
+        audit("fs_upload", {"path": str(tgt), "bytes": size})
+    return {"ok": True, "path": str(tgt), "size": size, "complete": final}
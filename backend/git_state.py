@@ -0,0 +1,384 @@
+import os, time, errno, signal, struct, asyncio, ctypes, ctypes.util
+from typing import Any, Dict, List, Optional, Tuple
+
+# Cached `git status` for the UI's polling endpoints. One parsed
+# `--porcelain=v2 --branch` result per repo is served from memory until
+# something that can change it does:
+#   - .git: index/HEAD/packed-refs/config/branch refs, compared by mtime
+#   - worktree: inotify on every non-ignored directory (Linux), else a short TTL.
+#     Vendor/tool directories (node_modules, .venv, ...) are never watched, and
+#     past STATION_GIT_INOTIFY_MAX_WATCHES directories the repo drops back to
+#     the TTL instead of eating the user's inotify watch budget.
+# Git runs with GIT_OPTIONAL_LOCKS=0 so polling never rewrites the index
+# (which would otherwise invalidate the cache it just filled).
+TTL_SEC = float(os.getenv("STATION_GIT_STATUS_TTL_SEC", "2"))  # without inotify
+MAX_AGE_SEC = float(os.getenv("STATION_GIT_STATUS_MAX_AGE_SEC", "60"))  # with inotify
+TIMEOUT_SEC = float(os.getenv("STATION_GIT_STATUS_TIMEOUT", "30"))
+MAX_FILES = int(os.getenv("STATION_GIT_STATUS_MAX_FILES", "2000"))
+USE_INOTIFY = os.getenv("STATION_GIT_INOTIFY", "1") != "0"
+MAX_WATCHES = int(os.getenv("STATION_GIT_INOTIFY_MAX_WATCHES", "8192"))
+SKIP_DIRS = set(os.getenv("STATION_GIT_INOTIFY_SKIP",
+                          ".git,node_modules,.venv,venv,__pycache__,.mypy_cache,.pytest_cache,.tox").split(","))
+
+_ENV = dict(os.environ, GIT_OPTIONAL_LOCKS="0", LC_ALL="C")
+
+async def _git(root: str, args: List[str], timeout: float = TIMEOUT_SEC) -> Tuple[int, str, str]:
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args, cwd=root, env=_ENV, stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True)
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
+    return proc.returncode, out.decode("utf-8", "replace"), err.decode("utf-8", "replace").strip()
+
+# ---------- porcelain v2 ----------
+
+def parse_porcelain_v2(out: str) -> Dict[str, Any]:
+    """Parse `git status --porcelain=v2 --branch -z [--ignored=matching]`."""
+    branch: Dict[str, Any] = {"head": None, "oid": None, "upstream": None, "ahead": 0, "behind": 0, "detached": False}
+    files: List[Dict[str, Any]] = []
+    ignored: List[str] = []
+    recs = out.split("\0")
+    i = 0
+    while i < len(recs):
+        rec = recs[i]
+        i += 1
+        if not rec:
+            continue
+        kind = rec[0]
+        if kind == "#":
+            key, _, val = rec[2:].partition(" ")
+            if key == "branch.oid":
+                branch["oid"] = None if val == "(initial)" else val
+            elif key == "branch.head":
+                branch["detached"] = val == "(detached)"
+                branch["head"] = None if branch["detached"] else val
+            elif key == "branch.upstream":
+                branch["upstream"] = val
+            elif key == "branch.ab":
+                a, b = val.split()
+                branch["ahead"], branch["behind"] = int(a), -int(b)
+        elif kind == "1":
+            f = rec.split(" ", 8)
+            files.append({"path": f[8], "index": f[1][0], "worktree": f[1][1], "kind": "changed"})
+        elif kind == "2":
+            f = rec.split(" ", 9)
+            files.append({"path": f[9], "orig": recs[i], "index": f[1][0], "worktree": f[1][1],
+                          "kind": "renamed" if f[8][0] == "R" else "copied"})
+            i += 1
+        elif kind == "u":
+            f = rec.split(" ", 10)
+            files.append({"path": f[10], "index": f[1][0], "worktree": f[1][1], "kind": "unmerged"})
+        elif kind == "?":
+            files.append({"path": rec[2:], "index": "?", "worktree": "?", "kind": "untracked"})
+        elif kind == "!":
+            ignored.append(rec[2:].rstrip("/"))
+    counts = {
+        "staged": sum(1 for f in files if f["kind"] not in ("untracked", "unmerged") and f["index"] != "."),
+        "unstaged": sum(1 for f in files if f["kind"] not in ("untracked", "unmerged") and f["worktree"] != "."),
+        "untracked": sum(1 for f in files if f["kind"] == "untracked"),
+        "conflicted": sum(1 for f in files if f["kind"] == "unmerged"),
+    }
+    return {"branch": branch, "files": files, "counts": counts, "clean": not files, "ignored": ignored}
+
+_C_ESC = {0x07: "a", 0x08: "b", 0x09: "t", 0x0a: "n", 0x0b: "v", 0x0c: "f", 0x0d: "r", 0x22: '"', 0x5c: "\\"}
+
+def quote_path(path: str) -> str:
+    """git's quote_c_style as `status --short` applies it (core.quotePath on,
+    and since 2.29 a space alone also forces quotes): control characters, '"',
+    '\\' and non-ASCII bytes are escaped and the path is wrapped in quotes."""
+    raw = path.encode("utf-8", "surrogateescape")
+    if not any(b <= 0x20 or b in (0x22, 0x5c) or b >= 0x7f for b in raw):
+        return path
+    out = []
+    for b in raw:
+        if b in _C_ESC:
+            out.append("\\" + _C_ESC[b])
+        elif b < 0x20 or b >= 0x7f:
+            out.append(f"\\{b:03o}")
+        else:
+            out.append(chr(b))
+    return '"' + "".join(out) + '"'
+
+def porcelain_v1(st: Dict[str, Any]) -> str:
+    """`git status --porcelain=v1 -b` text rebuilt from the parsed form, for
+    callers that still show the raw output."""
+    b = st["branch"]
+    head = "HEAD (no branch)" if b["detached"] else (b["head"] or "")
+    line = "## " + (f"No commits yet on {head}" if b["oid"] is None and not b["detached"] else head)
+    if b["upstream"]:
+        line += "..." + b["upstream"]
+        ab = [s for s in (f"ahead {b['ahead']}" if b["ahead"] else "", f"behind {b['behind']}" if b["behind"] else "") if s]
+        if ab:
+            line += " [" + ", ".join(ab) + "]"
+    lines = [line]
+    for f in st["files"]:
+        if f["kind"] == "untracked":
+            lines.append("?? " + quote_path(f["path"]))
+            continue
+        xy = (f["index"] + f["worktree"]).replace(".", " ")
+        path = quote_path(f["path"])
+        if "orig" in f:
+            path = f"{quote_path(f['orig'])} -> {path}"
+        lines.append(f"{xy} {path}")
+    return "\n".join(lines)
+
+# ---------- inotify ----------
+
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x400, 0x800, 0x4000, 0x8000, 0x40000000
+_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+         | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT = struct.Struct("iIII")
+_libc = None
+
+def _inotify_libc():
+    global _libc
+    if _libc is None:
+        lib = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        lib.inotify_init1, lib.inotify_add_watch  # AttributeError off Linux
+        _libc = lib
+    return _libc
+
+class Watcher:
+    """Non-blocking inotify over a worktree. No thread: pending events are
+    drained whenever the cache is consulted. Directories created since the
+    last `git status` are only queued in `pending`; the Repo walks them off
+    the loop once the next status has said which of them are ignored."""
+    def __init__(self, root: str, ignored: set):
+        self.libc = _inotify_libc()
+        self.root = root
+        self.ignored = ignored
+        self.wds: Dict[int, str] = {}
+        self.pending: set = set()
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        try:
+            self._add_tree("")
+        except OSError:
+            self.close()
+            raise
+
+    def _skip(self, rel: str) -> bool:
+        return os.path.basename(rel) in SKIP_DIRS or self.is_ignored(rel)
+
+    def _add_tree(self, rel: str):
+        if rel and self._skip(rel):
+            return
+        for dirpath, dirnames, _ in os.walk(os.path.join(self.root, rel)):
+            drel = os.path.relpath(dirpath, self.root)
+            drel = "" if drel == "." else drel
+            dirnames[:] = [d for d in dirnames if not self._skip(os.path.join(drel, d))]
+            if len(self.wds) >= MAX_WATCHES:
+                raise OSError(errno.ENOSPC, f"more than {MAX_WATCHES} directories to watch")
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), _MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):
+                    continue  # removed while walking
+                raise OSError(err, "inotify_add_watch: " + dirpath)  # ENOSPC: out of watches
+            self.wds[wd] = drel
+
+    def add_trees(self, rels: set):
+        """Watch newly created directories (blocking; run off the loop)."""
+        for rel in sorted(rels):
+            self._add_tree(rel)
+
+    def is_ignored(self, rel: str) -> bool:
+        while rel:
+            if rel in self.ignored:
+                return True
+            rel = os.path.dirname(rel)
+        return False
+
+    def changed(self) -> bool:
+        """True if anything relevant happened since the last call."""
+        dirty = False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return dirty
+            off = 0
+            while off < len(buf):
+                wd, mask, _, ln = _EVENT.unpack_from(buf, off)
+                name = buf[off + _EVENT.size: off + _EVENT.size + ln].rstrip(b"\0")
+                off += _EVENT.size + ln
+                if mask & IN_Q_OVERFLOW:
+                    dirty = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.wds.pop(wd, None)
+                    continue
+                base = self.wds.get(wd)
+                if base is None:
+                    continue
+                rel = os.path.join(base, os.fsdecode(name)) if name else base
+                if name and name == b".git":
+                    continue
+                if self.is_ignored(rel):
+                    continue
+                dirty = True
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    self.pending.add(rel)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+# ---------- cache ----------
+
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+class Repo:
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.git_dir: Optional[str] = None
+        self.data: Optional[Dict[str, Any]] = None
+        self.sig: Optional[tuple] = None
+        self.at = 0.0
+        self.git_ms = 0.0
+        self.dirty = True
+        self.task: Optional[asyncio.Future] = None
+        self.watcher: Optional[Watcher] = None
+        self.watch_error: Optional[str] = None if USE_INOTIFY else "disabled"
+        self.misc: Dict[tuple, tuple] = {}
+        self.stats = {"hits": 0, "refreshes": 0}
+
+    def _git_sig(self) -> tuple:
+        g = self.git_dir or os.path.join(self.root, ".git")
+        paths = ["index", "HEAD", "packed-refs", "config"]
+        if self.data:
+            b = self.data["branch"]
+            if b["head"]:
+                paths.append("refs/heads/" + b["head"])
+            if b["upstream"]:
+                paths.append("refs/remotes/" + b["upstream"])
+        return tuple(_mtime(os.path.join(g, p)) for p in paths)
+
+    def _sig(self) -> tuple:
+        return self._git_sig() + (_mtime(self.root),)
+
+    def fresh(self) -> bool:
+        if self.data is None or self.dirty:
+            return False
+        if self.watcher is not None:
+            if self.watcher.changed():
+                self.dirty = True
+                return False
+            max_age = MAX_AGE_SEC
+        else:
+            max_age = TTL_SEC
+        return self._sig() == self.sig and time.time() - self.at < max_age
+
+    async def _refresh(self):
+        try:
+            if self.git_dir is None:
+                rc, out, err = await _git(self.root, ["rev-parse", "--absolute-git-dir"])
+                if rc != 0:
+                    return {"ok": False, "rc": rc, "err": err}
+                self.git_dir = out.strip()
+            if self.watcher is not None:
+                self.watcher.changed()  # about to re-read everything anyway
+            sig = self._sig()
+            self.dirty = False
+            t0 = time.perf_counter()
+            rc, out, err = await _git(self.root, ["status", "--porcelain=v2", "--branch", "-z",
+                                                  "--untracked-files=normal", "--ignored=matching"])
+            if rc != 0:
+                self.dirty = True
+                return {"ok": False, "rc": rc, "err": err}
+            self.git_ms = round((time.perf_counter() - t0) * 1000, 1)
+            data = parse_porcelain_v2(out)
+            ignored = set(data.pop("ignored"))
+            self.data, self.sig, self.at = data, sig, time.time()
+            self.stats["refreshes"] += 1
+            loop = asyncio.get_running_loop()
+            if self.watcher is not None:
+                self.watcher.ignored = ignored
+                if self.watcher.pending:
+                    todo, self.watcher.pending = self.watcher.pending, set()
+                    try:
+                        await loop.run_in_executor(None, self.watcher.add_trees, todo)
+                        self.dirty = True  # changes made during the walk were not seen
+                    except OSError as e:
+                        # Out of watches (ours or the kernel's): poll instead.
+                        self.watcher.close()
+                        self.watcher = None
+                        self.watch_error = str(e) or type(e).__name__
+            elif self.watch_error is None:
+                try:
+                    # Walking a big tree takes a while; keep it off the loop.
+                    self.watcher = await loop.run_in_executor(None, Watcher, self.root, ignored)
+                    self.dirty = True  # changes made during the walk were not seen
+                except (OSError, AttributeError) as e:
+                    self.watch_error = str(e) or type(e).__name__
+            return None
+        finally:
+            self.task = None
+
+    def view(self, cached: bool) -> Dict[str, Any]:
+        d = self.data
+        files = d["files"]
+        return {
+            "ok": True, "rc": 0, "root": self.root,
+            "branch": d["branch"], "counts": d["counts"], "clean": d["clean"],
+            "files": files[:MAX_FILES], "truncated": len(files) > MAX_FILES,
+            "cached": cached, "age_sec": round(time.time() - self.at, 3), "git_ms": self.git_ms,
+            "watch": "inotify" if self.watcher is not None else "poll",
+        }
+
+    async def status(self, force: bool = False) -> Dict[str, Any]:
+        if not force and self.fresh():
+            self.stats["hits"] += 1
+            return self.view(True)
+        if force:
+            self.dirty = True
+        # Single-flight: concurrent polls share the running `git status`.
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._refresh())
+        err = await asyncio.shield(self.task)
+        if err is not None:
+            return err
+        return self.view(False)
+
+    async def git(self, args: List[str]) -> Tuple[int, str, str]:
+        """Read-only git command (log, remote -v, ...) cached until .git changes."""
+        if self.git_dir is None:
+            rc, out, _ = await _git(self.root, ["rev-parse", "--absolute-git-dir"])
+            if rc == 0:
+                self.git_dir = out.strip()
+        k = tuple(args)
+        sig = self._git_sig()
+        hit = self.misc.get(k)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        res = await _git(self.root, args)
+        if res[0] == 0:
+            self.misc[k] = (sig, res)
+        return res
+
+_repos: Dict[str, Repo] = {}
+
+def repo(root: str) -> Repo:
+    root = os.path.abspath(root)
+    r = _repos.get(root)
+    if r is None:
+        r = _repos[root] = Repo(root)
+    return r
+
+async def status(root: str, force: bool = False) -> Dict[str, Any]:
+    return await repo(root).status(force)
@@ -5,6 +5,7 @@ from pathlib import Path
 from starlette.responses import JSONResponse
 from starlette.requests import Request
 from .global_guards import require_edit_key, try_lock, unlock
+import git_state  # top-level, like app/routes/ops_git.py: one module, one cache
 
 ROOT = Path(os.environ.get("STATION_ROOT", str(Path.home() / "station_root")))
 
@@ -17,14 +18,11 @@ async def ops_git_status(request: Request):
     if err:
         return JSONResponse({"ok": False, "error": err}, status_code=401)
 
-    if not try_lock("ops_git_status", ttl_sec=10):
-        return JSONResponse({"ok": False, "error": "locked"}, status_code=423)
-
-    try:
-        code, out, e = _run(["git", "status", "--porcelain", "-b"], cwd=str(ROOT))
-        return JSONResponse({"ok": code == 0, "code": code, "stdout": out, "stderr": e})
-    finally:
-        unlock("ops_git_status")
+    # Cached and single-flight in git_state, so polls no longer need the lock.
+    st = await git_state.status(str(ROOT), force=request.query_params.get("refresh") in ("1", "true"))
+    if not st["ok"]:
+        return JSONResponse({"ok": False, "code": st["rc"], "stdout": "", "stderr": st["err"]})
+    return JSONResponse({**st, "code": 0, "stdout": git_state.porcelain_v1(st), "stderr": ""})
 
 async def ops_git_push(request: Request):
     err = require_edit_key(request.headers)
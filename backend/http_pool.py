@@ -0,0 +1,96 @@
+import os, random, asyncio, contextlib, importlib.util
+from typing import Dict, Optional, Any, AsyncIterator
+from urllib.parse import urlsplit
+import httpx
+
+# Shared outbound HTTP for async handlers: one keep-alive AsyncClient per
+# event loop (HTTP/2 when the optional h2 package is installed), a per-host
+# concurrency cap, and retries with full-jitter backoff.
+MAX_CONNECTIONS = int(os.getenv("STATION_HTTP_MAX_CONN", "100"))
+MAX_KEEPALIVE = int(os.getenv("STATION_HTTP_MAX_KEEPALIVE", "20"))
+PER_HOST = int(os.getenv("STATION_HTTP_PER_HOST", "32"))
+CONNECT_TIMEOUT = float(os.getenv("STATION_HTTP_CONNECT_TIMEOUT", "5"))
+DEFAULT_TIMEOUT = float(os.getenv("STATION_HTTP_TIMEOUT", "30"))
+RETRIES = int(os.getenv("STATION_HTTP_RETRIES", "2"))
+BACKOFF_SEC = float(os.getenv("STATION_HTTP_BACKOFF_SEC", "0.25"))
+RETRY_AFTER_MAX = 10.0
+HTTP2 = os.getenv("STATION_HTTP2", "1") != "0" and importlib.util.find_spec("h2") is not None
+RETRY_STATUS = {429, 502, 503, 504}
+IDEMPOTENT = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_state: Dict[str, Any] = {"loop": None, "client": None, "hosts": {}}
+
+def client() -> httpx.AsyncClient:
+    # Clients and semaphores are bound to the loop that created them.
+    loop = asyncio.get_running_loop()
+    c = _state["client"]
+    if _state["loop"] is not loop or c is None or c.is_closed:
+        c = httpx.AsyncClient(
+            http2=HTTP2,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+        _state.update(loop=loop, client=c, hosts={})
+    return c
+
+def _host_slot(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    sem = _state["hosts"].get(host)
+    if sem is None:
+        sem = _state["hosts"][host] = asyncio.Semaphore(PER_HOST)
+    return sem
+
+def _timeout(timeout: Optional[float]):
+    if timeout is None:
+        return httpx.USE_CLIENT_DEFAULT
+    return httpx.Timeout(timeout, connect=min(CONNECT_TIMEOUT, timeout))
+
+def _delay(attempt: int, resp: Optional[httpx.Response] = None) -> float:
+    if resp is not None:
+        ra = resp.headers.get("retry-after", "")
+        if ra.replace(".", "", 1).isdigit():
+            return min(float(ra), RETRY_AFTER_MAX)
+    return random.uniform(0, BACKOFF_SEC * (2 ** attempt))
+
+async def request(method: str, url: str, *, timeout: Optional[float] = None, retries: int = RETRIES,
+                  retry_status: Optional[bool] = None, **kw) -> httpx.Response:
+    """Send one request through the shared pool. Connection failures are always
+    retried (nothing reached the upstream); 429/5xx and mid-request transport
+    errors only when retry_status is true, which defaults to idempotent methods."""
+    method = method.upper()
+    if retry_status is None:
+        retry_status = method in IDEMPOTENT
+    c = client()
+    slot = _host_slot(url)
+    t = _timeout(timeout)
+    attempt = 0
+    while True:
+        resp = None
+        try:
+            async with slot:
+                resp = await c.request(method, url, timeout=t, **kw)
+            if not (retry_status and resp.status_code in RETRY_STATUS and attempt < retries):
+                return resp
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+            if attempt >= retries:
+                raise
+        except httpx.TransportError:
+            if not retry_status or attempt >= retries:
+                raise
+        await asyncio.sleep(_delay(attempt, resp))
+        attempt += 1
+
+@contextlib.asynccontextmanager
+async def stream(method: str, url: str, *, timeout: Optional[float] = None, **kw) -> AsyncIterator[httpx.Response]:
+    """Streaming request; the body is not read up front. The host slot and the
+    connection are held until the block exits, and leaving it early (e.g. the
+    downstream client went away) closes the upstream connection. No retries:
+    once bytes have been forwarded the request cannot be replayed."""
+    async with _host_slot(url):
+        async with client().stream(method.upper(), url, timeout=_timeout(timeout), **kw) as resp:
+            yield resp
+
+async def aclose():
+    c = _state["client"]
+    if c is not None and not c.is_closed:
+        await c.aclose()
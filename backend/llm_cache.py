@@ -0,0 +1,126 @@
+import os, re, json, time, asyncio, sqlite3, hashlib, threading, collections
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Response cache for LLM calls: normalized (scope, model, input, context) ->
+# response, with TTL, LRU bound, optional SQLite persistence, and single-flight
+# so concurrent identical prompts share one upstream call.
+TTL_SEC = float(os.getenv("STATION_LLM_CACHE_TTL_SEC", "300"))
+MAX_ENTRIES = int(os.getenv("STATION_LLM_CACHE_MAX", "512"))
+DB_PATH = os.getenv("STATION_LLM_CACHE_DB", "")
+
+_WS = re.compile(r"\s+")
+
+def key(model: str, input: Any, context: Any = None, scope: str = "") -> str:
+    """Whitespace-collapsed input and key-sorted JSON, so cosmetic differences
+    in the same prompt hit the same entry. `scope` separates credentials."""
+    norm_input = _WS.sub(" ", input).strip() if isinstance(input, str) else input
+    blob = json.dumps([scope, (model or "").strip().lower(), norm_input, context],
+                      sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def scope_of(api_key: str) -> str:
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+class ResponseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_sec: float = TTL_SEC, db_path: str = DB_PATH):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.mem: "collections.OrderedDict[str, Tuple[float, Any]]" = collections.OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "db_hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0}
+        self.local = threading.local()
+        if db_path:
+            self._db().execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (k TEXT PRIMARY KEY, expires REAL NOT NULL, v TEXT NOT NULL) WITHOUT ROWID")
+
+    def _db(self) -> sqlite3.Connection:
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.db_path, isolation_level=None, timeout=5)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+        return con
+
+    def _put_mem(self, k: str, expires: float, v: Any):
+        with self.lock:
+            self.mem[k] = (expires, v)
+            self.mem.move_to_end(k)
+            while len(self.mem) > self.max_entries:
+                self.mem.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get(self, k: str) -> Tuple[bool, Any]:
+        now = time.time()
+        with self.lock:
+            hit = self.mem.get(k)
+            if hit is not None:
+                if hit[0] > now:
+                    self.mem.move_to_end(k)
+                    self.stats["hits"] += 1
+                    return True, hit[1]
+                del self.mem[k]
+        if self.db_path:
+            row = self._db().execute("SELECT expires, v FROM llm_cache WHERE k=? AND expires>?", (k, now)).fetchone()
+            if row:
+                v = json.loads(row[1])
+                self._put_mem(k, row[0], v)
+                with self.lock:
+                    self.stats["db_hits"] += 1
+                return True, v
+        return False, None
+
+    def put(self, k: str, v: Any, ttl_sec: Optional[float] = None):
+        expires = time.time() + (self.ttl_sec if ttl_sec is None else ttl_sec)
+        self._put_mem(k, expires, v)
+        with self.lock:
+            self.stats["stores"] += 1
+            prune = self.db_path and self.stats["stores"] % 100 == 0
+        if self.db_path:
+            con = self._db()
+            con.execute("INSERT OR REPLACE INTO llm_cache(k, expires, v) VALUES(?,?,?)", (k, expires, json.dumps(v)))
+            if prune:
+                con.execute("DELETE FROM llm_cache WHERE expires<=?", (time.time(),))
+
+    async def get_or_fetch(self, k: str, fetch: Callable[[], Awaitable[Tuple[Any, bool]]]) -> Tuple[Any, str]:
+        """Returns (value, source) with source in hit/coalesced/miss. `fetch`
+        returns (value, cacheable); failures are shared with waiters, not cached.
+        The upstream call runs as its own task, so a caller that goes away does
+        not cancel it for the others (and its result still gets cached)."""
+        ok, v = self.get(k)
+        if ok:
+            return v, "hit"
+        task = self.inflight.get(k)
+        if task is not None:
+            with self.lock:
+                self.stats["coalesced"] += 1
+            return await asyncio.shield(task), "coalesced"
+        with self.lock:
+            self.stats["misses"] += 1
+
+        async def run():
+            try:
+                v, cacheable = await fetch()
+                if cacheable:
+                    self.put(k, v)
+                return v
+            finally:
+                self.inflight.pop(k, None)
+
+        task = self.inflight[k] = asyncio.ensure_future(run())
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # no "never retrieved" noise
+        return await asyncio.shield(task), "miss"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            s = dict(self.stats)
+            s["size"] = len(self.mem)
+        served = s["hits"] + s["db_hits"] + s["coalesced"]
+        total = served + s["misses"]
+        s.update(max=self.max_entries, ttl_sec=self.ttl_sec, persistent=bool(self.db_path),
+                 inflight=len(self.inflight), hit_rate=round(served / total, 4) if total else None)
+        return s
+
+cache = ResponseCache()
@@ -150,8 +150,9 @@ except Exception:
 
 # === STATION_OPS_BLOCK_V3 ===
 # Guaranteed ops route registration for Starlette
-import os, time, subprocess
+import os, time, subprocess, contextlib
 from typing import Dict, Any
+import ratelimit, http_pool, proc_runner, git_state
 
 try:
     from starlette.responses import JSONResponse
@@ -160,7 +161,6 @@ except Exception:
     JSONResponse = None
     Route = None
 
-_OPS_BUCKET: Dict[str, Dict[str, Any]] = {}
 
 def _now_iso():
     try:
@@ -186,20 +186,10 @@ def _edit_key_ok(request) -> bool:
     return bool(got) and got == want
 
 def _ops_allow(ip: str, limit: int = 30):
-    now = int(time.time())
-    w = now // 60
-    b = _OPS_BUCKET.get(ip)
-    if not b or b.get("w") != w:
-        _OPS_BUCKET[ip] = {"w": w, "c": 1}
-        return True
-    if b["c"] >= limit:
-        return False
-    b["c"] += 1
-    return True
+    return ratelimit.allow("ops", ip, limit, 60)
 
-def _run(cmd, cwd=None, timeout=30):
-    p = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, timeout=timeout)
-    return p.returncode, p.stdout.strip(), p.stderr.strip()
+async def _run(cmd, cwd=None, timeout=30, request=None):
+    return await proc_runner.run(cmd, cwd=cwd, timeout=timeout, request=request)
 
 async def _info(request):
     return JSONResponse({
@@ -221,8 +211,26 @@ async def _ops_git_status(request):
     if not _ops_allow(ip):
         return JSONResponse({"ok": False, "error": "rate_limited"}, status_code=429)
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    rc, out, err = _run(["git", "status", "--porcelain=v1", "-b"], cwd=root, timeout=60)
-    return JSONResponse({"ok": rc == 0, "rc": rc, "out": out, "err": err})
+    return JSONResponse(await _git_status(root, request))
+
+async def _git_status(root, request):
+    # Served from git_state's cache; "out" keeps the porcelain v1 text for
+    # older clients. ?refresh=1 forces a new `git status`.
+    st = await git_state.status(root, force=request.query_params.get("refresh") in ("1", "true"))
+    if st["ok"]:
+        st["out"], st["err"] = git_state.porcelain_v1(st), ""
+    return st
+
+async def _git_steps(steps, root):
+    # SSE body for ?stream=1: a "step" event per git command, then its output.
+    for name, cmd, timeout in steps:
+        yield "step", name
+        # aclosing: if the client goes away mid-step, close the inner stream
+        # right here so its finally kills the git process, instead of leaving
+        # it to whenever the abandoned generator gets collected.
+        async with contextlib.aclosing(proc_runner.stream(cmd, cwd=root, timeout=timeout)) as events:
+            async for event in events:
+                yield event
 
 async def _ops_git_push(request):
     if not _edit_key_ok(request):
@@ -231,9 +239,14 @@ async def _ops_git_push(request):
     if not _ops_allow(ip):
         return JSONResponse({"ok": False, "error": "rate_limited"}, status_code=429)
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    _run(["git", "add", "-A"], cwd=root, timeout=60)
-    rc1, out1, err1 = _run(["git", "commit", "-m", "station: ops commit"], cwd=root, timeout=60)
-    rc2, out2, err2 = _run(["git", "push"], cwd=root, timeout=120)
+    steps = [("add", ["git", "add", "-A"], 60),
+             ("commit", ["git", "commit", "-m", "station: ops commit"], 60),
+             ("push", ["git", "push"], 120)]
+    if request.query_params.get("stream") in ("1", "true"):
+        return proc_runner.sse_response(_git_steps(steps, root))
+    await _run(steps[0][1], cwd=root, timeout=steps[0][2], request=request)
+    rc1, out1, err1 = await _run(steps[1][1], cwd=root, timeout=steps[1][2], request=request)
+    rc2, out2, err2 = await _run(steps[2][1], cwd=root, timeout=steps[2][2], request=request)
     return JSONResponse({
         "ok": (rc2 == 0),
         "commit": {"rc": rc1, "out": out1, "err": err1},
@@ -257,15 +270,15 @@ async def _ops_render_deploy(request):
     if not api_key or not service_id:
         return JSONResponse({"ok": False, "error": "missing_render_api_key_or_service_id"}, status_code=400)
 
-    import requests
     url = f"https://api.render.com/v1/services/{service_id}/deploys"
-    r = requests.post(url, headers={"Authorization": f"Bearer {api_key}"}, timeout=30)
+    # Not idempotent (each POST starts a deploy): only connect failures are retried.
+    r = await http_pool.request("POST", url, headers={"Authorization": f"Bearer {api_key}"}, timeout=30)
     j = None
     try:
         j = r.json()
     except Exception:
         j = {"text": r.text}
-    return JSONResponse({"ok": r.ok, "status": r.status_code, "json": j})
+    return JSONResponse({"ok": r.is_success, "status": r.status_code, "json": j})
 
 def _register_ops_routes(app_obj):
     if JSONResponse is None or Route is None:
@@ -297,15 +310,19 @@ except Exception:
 # Hard guarantee: registers /chat + core endpoints on whatever ASGI app is created.
 import os, time, subprocess
 from typing import Dict, Any
+import contextlib
+import ratelimit, http_pool, llm_cache, proc_runner, git_state
+
+_OPENAI_BASE = os.getenv("STATION_OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
 
 try:
-    from starlette.responses import JSONResponse
+    from starlette.responses import JSONResponse, StreamingResponse
     from starlette.routing import Route
+    from starlette.background import BackgroundTask
 except Exception:
     JSONResponse = None
     Route = None
 
-_OPS_BUCKET: Dict[str, Dict[str, Any]] = {}
 
 def _now_iso():
     try:
@@ -331,20 +348,10 @@ def _edit_key_ok(request) -> bool:
     return bool(got) and got == want
 
 def _ops_allow(ip: str, limit: int = 30):
-    now = int(time.time())
-    w = now // 60
-    b = _OPS_BUCKET.get(ip)
-    if not b or b.get("w") != w:
-        _OPS_BUCKET[ip] = {"w": w, "c": 1}
-        return True
-    if b["c"] >= limit:
-        return False
-    b["c"] += 1
-    return True
+    return ratelimit.allow("ops", ip, limit, 60)
 
-def _run(cmd, cwd=None, timeout=60):
-    p = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, timeout=timeout)
-    return p.returncode, p.stdout.strip(), p.stderr.strip()
+async def _run(cmd, cwd=None, timeout=60, request=None):
+    return await proc_runner.run(cmd, cwd=cwd, timeout=timeout, request=request)
 
 async def station_health(request):
     return JSONResponse({"status":"ok","runtime":"station","env":os.getenv("ENV","termux"),"engine":os.getenv("ENGINE","starlette-core")})
@@ -362,6 +369,55 @@ async def station_info(request):
 async def station_version(request):
     return JSONResponse({"version": _read_version(), "time": _now_iso()})
 
+async def _sse_data(lines):
+    # Collapse upstream SSE lines into one string per event's data field.
+    buf = []
+    async for line in lines:
+        if line.startswith("data:"):
+            buf.append(line[5:].lstrip(" "))
+        elif line == "" and buf:
+            data, buf = "\n".join(buf), []
+            if data != "[DONE]":
+                yield data
+    if buf and buf != ["[DONE]"]:
+        yield "\n".join(buf)
+
+async def _chat_stream(api_key: str, model: str, user_input: str, fmt: str = "sse"):
+    # Upstream SSE is forwarded as it arrives. Each chunk is pulled only after
+    # the previous one was sent (backpressure), and when the client disconnects
+    # Starlette cancels the generator, which closes the upstream request.
+    stack = contextlib.AsyncExitStack()
+    try:
+        r = await stack.enter_async_context(http_pool.stream(
+            "POST", _OPENAI_BASE + "/responses",
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json", "Accept": "text/event-stream"},
+            json={"model": model, "input": user_input, "stream": True},
+            timeout=60,
+        ))
+    except Exception as e:
+        await stack.aclose()
+        return JSONResponse({"ok": False, "error": f"upstream: {e}"}, status_code=502)
+    if not r.is_success:
+        text = (await r.aread()).decode("utf-8", "replace")
+        await stack.aclose()
+        return JSONResponse({"ok": False, "status": r.status_code, "text": text[:4000]}, status_code=502)
+
+    async def gen():
+        try:
+            if fmt == "jsonl":
+                async for data in _sse_data(r.aiter_lines()):
+                    yield data + "\n"
+            else:
+                async for chunk in r.aiter_raw():
+                    yield chunk
+        finally:
+            await stack.aclose()
+
+    media = "application/x-ndjson" if fmt == "jsonl" else "text/event-stream"
+    # background: also closes upstream if the client left before the first chunk.
+    return StreamingResponse(gen(), media_type=media, background=BackgroundTask(stack.aclose),
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 async def station_chat(request):
     try:
         body = await request.json()
@@ -377,17 +433,35 @@ async def station_chat(request):
     if not api_key:
         return JSONResponse({"ok": False, "error": "missing_api_key"}, status_code=400)
 
-    import requests
-    url = "https://api.openai.com/v1/responses"
-    payload = {"model": model, "input": user_input}
-    r = requests.post(url, headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}, json=payload, timeout=60)
+    stream = body.get("stream") or request.query_params.get("stream") in ("1", "true")
+    if stream:
+        fmt = (body.get("format") or request.query_params.get("format") or "sse").lower()
+        return await _chat_stream(api_key, model, user_input, fmt)
 
-    try:
-        data = r.json()
-    except Exception:
-        return JSONResponse({"ok": False, "status": r.status_code, "text": r.text}, status_code=502)
+    async def fetch():
+        url = _OPENAI_BASE + "/responses"
+        payload = {"model": model, "input": user_input}
+        r = await http_pool.request("POST", url, headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}, json=payload, timeout=60, retry_status=True)
+        try:
+            return {"status": r.status_code, "data": r.json()}, r.is_success
+        except Exception:
+            return {"status": r.status_code, "text": r.text}, False
+
+    # Identical prompts (per API key) are answered from llm_cache; concurrent
+    # ones share a single upstream call. "cache": false or
+    # Cache-Control: no-cache forces a fresh answer.
+    if body.get("cache") is False or "no-cache" in request.headers.get("cache-control", ""):
+        res, source = (await fetch())[0], "bypass"
+    else:
+        k = llm_cache.key(model, user_input, scope=llm_cache.scope_of(api_key))
+        res, source = await llm_cache.cache.get_or_fetch(k, fetch)
+
+    if "text" in res:
+        return JSONResponse({"ok": False, "status": res["status"], "text": res["text"]}, status_code=502)
+    return JSONResponse({"ok": 200 <= res["status"] < 300, "status": res["status"], "data": res["data"], "cache": source})
 
-    return JSONResponse({"ok": r.ok, "status": r.status_code, "data": data})
+async def station_chat_cache(request):
+    return JSONResponse({"ok": True, "cache": llm_cache.cache.snapshot()})
 
 async def ops_git_status(request):
     if not _edit_key_ok(request):
@@ -396,8 +470,7 @@ async def ops_git_status(request):
     if not _ops_allow(ip):
         return JSONResponse({"ok":False,"error":"rate_limited"}, status_code=429)
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    rc, out, err = _run(["git","status","--porcelain=v1","-b"], cwd=root, timeout=60)
-    return JSONResponse({"ok": rc==0, "rc": rc, "out": out, "err": err})
+    return JSONResponse(await _git_status(root, request))
 
 def __station_bootstrap(app_obj):
     if JSONResponse is None or Route is None:
@@ -416,6 +489,7 @@ def __station_bootstrap(app_obj):
     add("/info", station_info, ["GET"])
     add("/version", station_version, ["GET"])
     add("/chat", station_chat, ["POST"])
+    add("/chat/cache", station_chat_cache, ["GET"])
     add("/ops/git/status", ops_git_status, ["POST"])
 
 # Best-effort: if app already exists now, bootstrap immediately.
@@ -428,17 +502,76 @@ except Exception:
 # === STATION_AGENT_BRIDGE_V1 ===
 
 # === STATION_AGENT_BRIDGE_V1 ===
-import os, json
+import os, json, time, asyncio
 from typing import Any, Dict
 
 try:
-    from starlette.responses import JSONResponse
+    from starlette.responses import JSONResponse, StreamingResponse
     from starlette.routing import Route
 except Exception:
     JSONResponse = None
+    StreamingResponse = None
     Route = None
 
-from agent_queue import submit_task, claim_next, set_result, get_task, list_recent
+from agent_queue import submit_task, submit_batch, parent_results, append_log, read_log, log_size, task_status, SUBMIT_BATCH_MAX, CLAIM_BATCH_MAX, claim_batch, set_result, get_task, list_recent, heartbeat, start_reaper, compact as agent_queue_compact, add_listener, stats as agent_queue_stats
+
+AGENT_MAX_WAIT_SEC = int(os.getenv("STATION_AGENT_MAX_WAIT_SEC", "60"))
+AGENT_STREAM_KEEPALIVE_SEC = 15.0
+AGENT_STREAM_HELD_POLL_SEC = 1.0
+
+# Long-poll wakeups: submit_task (any thread) -> call_soon_threadsafe -> notify_all.
+_agent_cond = asyncio.Condition()
+_agent_loop = None
+_agent_gen = 0
+
+async def _agent_wake():
+    global _agent_gen
+    async with _agent_cond:
+        _agent_gen += 1
+        _agent_cond.notify_all()
+
+def _agent_signal():
+    loop = _agent_loop
+    if loop is None or loop.is_closed():
+        return
+    loop.call_soon_threadsafe(lambda: asyncio.ensure_future(_agent_wake()))
+
+async def _agent_startup():
+    global _agent_loop
+    _agent_loop = asyncio.get_running_loop()
+    add_listener(_agent_signal)
+    start_reaper()
+
+async def _agent_wait(seen: int, timeout: float) -> None:
+    # `seen` is the generation read before the last claim attempt, so a
+    # submit landing between that claim and this wait is not missed.
+    try:
+        async with _agent_cond:
+            await asyncio.wait_for(_agent_cond.wait_for(lambda: _agent_gen != seen), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+def _runner_types(request):
+    # Runners announce accepted task types as ?types=shell,llm (absent = any).
+    raw = request.query_params.get("types") or ""
+    return [t.strip() for t in raw.split(",") if t.strip()] or None
+
+def _tasks_json(got):
+    # DAG children get their parents' results alongside the payload.
+    parents = parent_results([t[0] for t in got]) if got else {}
+    out = []
+    for tid, payload, task_type in got:
+        t = {"id": tid, "task_type": task_type, "payload": payload}
+        if tid in parents:
+            t["parents"] = parents[tid]
+        out.append(t)
+    return out
+
+async def _agent_claim(runner_id, n, types, max_held=None):
+    # claim_batch takes SQLite's write lock and may sit in busy_timeout under
+    # contention, so it runs on a worker thread instead of stalling the loop.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: _tasks_json(claim_batch(runner_id, n, types, max_held)))
 
 def _edit_key_ok(request) -> bool:
     want = os.getenv("STATION_EDIT_KEY", "1234")
@@ -459,18 +592,93 @@ async def agent_submit(request):
         body = {}
     task_type = (body.get("task_type") or "shell").strip()
     payload = body.get("payload") or {}
-    tid = submit_task(task_type, payload)
+    try:
+        priority = int(body.get("priority") or 0)
+    except Exception:
+        return JSONResponse({"ok": False, "error": "bad_priority"}, status_code=400)
+    try:
+        tid = submit_task(task_type, payload, priority, body.get("idempotency_key"), body.get("depends_on"))
+    except (TypeError, ValueError) as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
     return JSONResponse({"ok": True, "task_id": tid})
 
+async def agent_submit_batch(request):
+    if not _edit_key_ok(request):
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+    tasks = body.get("tasks") if isinstance(body, dict) else None
+    if not isinstance(tasks, list) or not tasks or not all(isinstance(t, dict) for t in tasks):
+        return JSONResponse({"ok": False, "error": "missing_tasks"}, status_code=400)
+    try:
+        got = submit_batch(tasks)
+    except (TypeError, ValueError) as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=413 if len(tasks) > SUBMIT_BATCH_MAX else 400)
+    return JSONResponse({
+        "ok": True,
+        "task_ids": [g["task_id"] for g in got],
+        "duplicates": [g["task_id"] for g in got if g["duplicate"]],
+    })
+
 async def agent_next(request):
     if not _runner_key_ok(request):
         return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
     runner_id = request.query_params.get("runner_id") or "termux"
-    got = claim_next(runner_id)
+    types = _runner_types(request)
+    try:
+        n = int(request.query_params.get("max") or 0)
+        wait = float(request.query_params.get("wait") or 0)
+    except Exception:
+        return JSONResponse({"ok": False, "error": "bad_query"}, status_code=400)
+    # ?wait=S long-polls: sleep on the condition until a submit (or the
+    # reaper) signals new work, instead of the runner re-polling.
+    deadline = time.monotonic() + max(0.0, min(wait, AGENT_MAX_WAIT_SEC))
+    while True:
+        seen = _agent_gen
+        got = await _agent_claim(runner_id, n or 1, types)
+        left = deadline - time.monotonic()
+        if got or left <= 0 or await request.is_disconnected():
+            break
+        await _agent_wait(seen, left)
+    if n:
+        return JSONResponse({"ok": True, "tasks": got})
     if not got:
         return JSONResponse({"ok": True, "task": None})
-    tid, payload, task_type = got
-    return JSONResponse({"ok": True, "task": {"id": tid, "task_type": task_type, "payload": payload}})
+    return JSONResponse({"ok": True, "task": got[0]})
+
+async def agent_stream(request):
+    """SSE push: each claimed task is sent as one `task` event; leases cover lost deliveries."""
+    if not _runner_key_ok(request):
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    runner_id = request.query_params.get("runner_id") or "termux"
+    types = _runner_types(request)
+    # ?inflight=N: push a new task only while this runner holds fewer than N
+    # running ones, so one connected runner cannot lease the whole queue.
+    try:
+        inflight = int(request.query_params.get("inflight") or 1)
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "bad_query"}, status_code=400)
+    inflight = max(1, min(inflight, CLAIM_BATCH_MAX))
+
+    async def gen():
+        last_beat = time.monotonic()
+        while not await request.is_disconnected():
+            seen = _agent_gen
+            got = await _agent_claim(runner_id, 1, types, inflight)
+            if got:
+                yield "event: task\ndata: " + json.dumps(got[0]) + "\n\n"
+                last_beat = time.monotonic()
+                continue
+            if time.monotonic() - last_beat >= AGENT_STREAM_KEEPALIVE_SEC:
+                yield ": keepalive\n\n"
+                last_beat = time.monotonic()
+            # Finishing a task frees a slot without signalling new work, so
+            # recheck soon rather than waiting out a whole keepalive.
+            await _agent_wait(seen, AGENT_STREAM_HELD_POLL_SEC)
+
+    return StreamingResponse(gen(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 async def agent_result(request):
     if not _runner_key_ok(request):
@@ -480,14 +688,42 @@ async def agent_result(request):
     except Exception:
         body = {}
     tid = int(body.get("task_id") or 0)
+    runner_id = str(body.get("runner_id") or "").strip()
     ok = bool(body.get("ok"))
     result = body.get("result") or {}
     err = body.get("error") or ""
     if tid <= 0:
         return JSONResponse({"ok": False, "error": "missing_task_id"}, status_code=400)
-    set_result(tid, ok, result, err)
+    if not runner_id:
+        return JSONResponse({"ok": False, "error": "missing_runner_id"}, status_code=400)
+    if not set_result(tid, runner_id, ok, result, err):
+        return JSONResponse({"ok": False, "error": "lease_lost"}, status_code=409)
+    await _log_wake()  # lets log followers see the task finish right away
     return JSONResponse({"ok": True})
 
+async def agent_heartbeat(request):
+    if not _runner_key_ok(request):
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+    runner_id = body.get("runner_id") or "termux"
+    try:
+        tid = int(body.get("task_id") or 0)
+        extend = body.get("extend_sec")
+        extend = int(extend) if extend not in (None, "") else None
+    except (TypeError, ValueError):
+        return JSONResponse({"ok": False, "error": "bad_request"}, status_code=400)
+    if tid <= 0:
+        return JSONResponse({"ok": False, "error": "missing_task_id"}, status_code=400)
+    if extend is not None and extend <= 0:
+        return JSONResponse({"ok": False, "error": "bad_extend_sec"}, status_code=400)
+    leased_until = heartbeat(tid, runner_id, extend)
+    if leased_until is None:
+        return JSONResponse({"ok": False, "error": "lease_lost"}, status_code=409)
+    return JSONResponse({"ok": True, "leased_until": leased_until})
+
 async def agent_task_get(request):
     if not _edit_key_ok(request):
         return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
@@ -495,11 +731,135 @@ async def agent_task_get(request):
     t = get_task(tid)
     return JSONResponse({"ok": True, "task": t})
 
+AGENT_LOG_CHUNK_MAX = 1024 * 1024
+_log_cond = asyncio.Condition()
+_log_gen = 0
+
+async def _log_wake():
+    global _log_gen
+    async with _log_cond:
+        _log_gen += 1
+        _log_cond.notify_all()
+
+async def agent_log_append(request):
+    if not _runner_key_ok(request):
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    tid = int(request.path_params.get("tid") or 0)
+    if task_status(tid) is None:
+        return JSONResponse({"ok": False, "error": "unknown_task"}, status_code=404)
+    too_large = JSONResponse({"ok": False, "error": "chunk_too_large", "max": AGENT_LOG_CHUNK_MAX}, status_code=413)
+    try:
+        declared = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "bad_content_length"}, status_code=400)
+    if declared > AGENT_LOG_CHUNK_MAX:
+        return too_large
+    # Chunked uploads carry no length: stop reading once past the cap.
+    buf = bytearray()
+    async for part in request.stream():
+        buf += part
+        if len(buf) > AGENT_LOG_CHUNK_MAX:
+            return too_large
+    data = bytes(buf)
+    off = request.query_params.get("offset")
+    try:
+        size = append_log(tid, data, int(off) if off not in (None, "") else None)
+    except ValueError as e:
+        return JSONResponse({"ok": False, "error": "offset_mismatch", "size": e.args[0]}, status_code=409)
+    await _log_wake()
+    return JSONResponse({"ok": True, "size": size})
+
+def _utf8_whole(data: bytes) -> int:
+    # Length of the longest prefix that does not end inside a UTF-8 sequence.
+    for i in range(1, min(4, len(data)) + 1):
+        b = data[-i]
+        if b & 0xC0 != 0x80:  # ASCII or a lead byte
+            need = 1 if b < 0xC0 else 2 if b < 0xE0 else 3 if b < 0xF0 else 4
+            return len(data) if need <= i else len(data) - i
+    return len(data)
+
+async def agent_log_get(request):
+    """Ranged read (?offset=&limit=) or, with ?follow=1, an SSE tail that ends once the task finishes."""
+    if not _edit_key_ok(request):
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    tid = int(request.path_params.get("tid") or 0)
+    q = request.query_params
+    try:
+        offset = int(q.get("offset") or 0)
+        limit = max(1, min(int(q.get("limit") or 65536), AGENT_LOG_CHUNK_MAX))
+    except Exception:
+        return JSONResponse({"ok": False, "error": "bad_query"}, status_code=400)
+    if offset < 0:
+        offset = max(0, log_size(tid, archived=True) + offset)
+    if (q.get("follow") or "").lower() not in ("1", "true", "yes"):
+        # Raw bytes: a range may split a UTF-8 character, the client joins ranges.
+        data = read_log(tid, offset, limit)
+        return StreamingResponse(iter([data]), media_type="text/plain; charset=utf-8", headers={
+            "X-Log-Offset": str(offset), "X-Log-Next": str(offset + len(data)),
+            "X-Log-Size": str(log_size(tid, archived=True)),
+        })
+
+    async def gen():
+        pos, step = offset, max(limit, 4)  # room for one whole 4-byte character
+        while not await request.is_disconnected():
+            seen = _log_gen
+            data = read_log(tid, pos, step)
+            # Events carry text, so stop at the last whole UTF-8 character; a
+            # split one is re-read with the rest of its bytes next round.
+            n = _utf8_whole(data)
+            if n:
+                yield "event: log\ndata: " + json.dumps({"offset": pos, "data": data[:n].decode("utf-8", "replace")}) + "\n\n"
+                pos += n
+                continue
+            t = get_task(tid)
+            if not t or t["status"] in ("done", "failed", "dead"):
+                if data:  # torn last character of a finished log: nothing more is coming
+                    yield "event: log\ndata: " + json.dumps({"offset": pos, "data": data.decode("utf-8", "replace")}) + "\n\n"
+                    pos += len(data)
+                yield "event: end\ndata: " + json.dumps({"offset": pos, "status": t["status"] if t else None}) + "\n\n"
+                return
+            try:
+                async with _log_cond:
+                    await asyncio.wait_for(_log_cond.wait_for(lambda: _log_gen != seen), 1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    return StreamingResponse(gen(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def agent_log(request):
+    # One route per path: the registrars dedupe on path, not method.
+    if request.method == "POST":
+        return await agent_log_append(request)
+    return await agent_log_get(request)
+
 async def agent_recent(request):
     if not _edit_key_ok(request):
         return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
-    lim = int(request.query_params.get("limit") or 25)
-    return JSONResponse({"ok": True, "items": list_recent(lim)})
+    q = request.query_params
+    try:
+        lim = int(q.get("limit") or 25)
+        before_id = int(q.get("before_id") or 0)
+    except Exception:
+        return JSONResponse({"ok": False, "error": "bad_query"}, status_code=400)
+    lim = max(1, min(lim, 200))
+    full = (q.get("full") or "").lower() in ("1", "true", "yes")
+    items = list_recent(lim, before_id=before_id, status=q.get("status"), task_type=q.get("task_type"), full=full)
+    next_before_id = items[-1]["id"] if len(items) >= lim else None
+    return JSONResponse({"ok": True, "items": items, "next_before_id": next_before_id})
+
+async def agent_stats(request):
+    if not _edit_key_ok(request):
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    return JSONResponse({"ok": True, "stats": agent_queue_stats()})
+
+async def agent_compact(request):
+    # One-off rebuild (VACUUM) of a queue DB created before auto_vacuum; it
+    # blocks submits and claims while it runs, so an operator triggers it.
+    if not _edit_key_ok(request):
+        return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    loop = asyncio.get_running_loop()
+    got = await loop.run_in_executor(None, lambda: agent_queue_compact(full=True))
+    return JSONResponse({"ok": True, **got})
 
 def _register_agent_routes(app_obj):
     if Route is None:
@@ -515,14 +875,21 @@ def _register_agent_routes(app_obj):
             existing.add(path)
 
     add("/agent/tasks/submit", agent_submit, ["POST"])
+    add("/agent/tasks/submit_batch", agent_submit_batch, ["POST"])
     add("/agent/tasks/next", agent_next, ["GET"])
+    add("/agent/tasks/stream", agent_stream, ["GET"])
     add("/agent/tasks/result", agent_result, ["POST"])
+    add("/agent/tasks/heartbeat", agent_heartbeat, ["POST"])
     add("/agent/tasks/recent", agent_recent, ["GET"])
+    add("/agent/tasks/stats", agent_stats, ["GET"])
+    add("/agent/tasks/compact", agent_compact, ["POST"])
+    add("/agent/tasks/{tid:int}/log", agent_log, ["GET", "POST"])
     add("/agent/tasks/{tid:int}", agent_task_get, ["GET"])
 
 try:
     if "app" in globals():
         _register_agent_routes(app)
+        app.add_event_handler("startup", _agent_startup)
 except Exception:
     pass
 
@@ -531,6 +898,9 @@ except Exception:
 # === STATION_FORCE_CORE_V1 ===
 import os, time, subprocess
 from typing import Dict, Any
+import ratelimit, http_pool, proc_runner, git_state
+
+_OPENAI_BASE = os.getenv("STATION_OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
 
 try:
     from starlette.responses import JSONResponse
@@ -566,22 +936,11 @@ def _runner_key_ok(request) -> bool:
     got = request.headers.get("x-runner-key", "")
     return bool(got) and got == want
 
-_OPS_BUCKET: Dict[str, Dict[str, Any]] = {}
 def _ops_allow(ip: str, limit: int = 40):
-    now = int(time.time())
-    w = now // 60
-    b = _OPS_BUCKET.get(ip)
-    if not b or b.get("w") != w:
-        _OPS_BUCKET[ip] = {"w": w, "c": 1}
-        return True
-    if b["c"] >= limit:
-        return False
-    b["c"] += 1
-    return True
+    return ratelimit.allow("ops", ip, limit, 60)
 
-def _run(cmd, cwd=None, timeout=120):
-    p = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, timeout=timeout)
-    return p.returncode, p.stdout.strip(), p.stderr.strip()
+async def _run(cmd, cwd=None, timeout=120, request=None):
+    return await proc_runner.run(cmd, cwd=cwd, timeout=timeout, request=request)
 
 async def station_health(request):
     return JSONResponse({"status":"ok","runtime":"station","env":os.getenv("ENV","termux"),"engine":os.getenv("ENGINE","starlette-core")})
@@ -599,8 +958,7 @@ async def ops_git_status(request):
     if not _ops_allow(ip):
         return JSONResponse({"ok":False,"error":"rate_limited"}, status_code=429)
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    rc, out, err = _run(["git","status","--porcelain=v1","-b"], cwd=root)
-    return JSONResponse({"ok":rc==0,"rc":rc,"out":out,"err":err})
+    return JSONResponse(await _git_status(root, request))
 
 async def ops_git_push(request):
     if not _edit_key_ok(request):
@@ -609,9 +967,14 @@ async def ops_git_push(request):
     if not _ops_allow(ip):
         return JSONResponse({"ok":False,"error":"rate_limited"}, status_code=429)
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    _run(["git","add","-A"], cwd=root, timeout=180)
-    rc1, out1, err1 = _run(["git","commit","-m","station: ops commit"], cwd=root, timeout=180)
-    rc2, out2, err2 = _run(["git","push"], cwd=root, timeout=240)
+    steps = [("add", ["git","add","-A"], 180),
+             ("commit", ["git","commit","-m","station: ops commit"], 180),
+             ("push", ["git","push"], 240)]
+    if request.query_params.get("stream") in ("1", "true"):
+        return proc_runner.sse_response(_git_steps(steps, root))
+    await _run(steps[0][1], cwd=root, timeout=steps[0][2], request=request)
+    rc1, out1, err1 = await _run(steps[1][1], cwd=root, timeout=steps[1][2], request=request)
+    rc2, out2, err2 = await _run(steps[2][1], cwd=root, timeout=steps[2][2], request=request)
     return JSONResponse({"ok":rc2==0,"commit":{"rc":rc1,"out":out1,"err":err1},"push":{"rc":rc2,"out":out2,"err":err2}})
 
 # /chat: raw proxy to OpenAI Responses API (frontend may pass api_key)
@@ -628,18 +991,19 @@ async def station_chat(request):
     if not api_key:
         return JSONResponse({"ok":False,"error":"missing_api_key"}, status_code=400)
 
-    import requests
-    r = requests.post(
-        "https://api.openai.com/v1/responses",
+    r = await http_pool.request(
+        "POST",
+        _OPENAI_BASE + "/responses",
         headers={"Authorization": f"Bearer {api_key}", "Content-Type":"application/json"},
         json={"model": model, "input": user_input},
         timeout=60,
+        retry_status=True,
     )
     try:
         data = r.json()
     except Exception:
         return JSONResponse({"ok":False,"status":r.status_code,"text":r.text}, status_code=502)
-    return JSONResponse({"ok": r.ok, "status": r.status_code, "data": data})
+    return JSONResponse({"ok": r.is_success, "status": r.status_code, "data": data})
 
 # === STATION_ROUTE_REG_V1 ===
 
@@ -666,9 +1030,15 @@ def _station_register_all_routes(app_obj):
     add("/ops/git/push", ops_git_push, ["POST"])
 
     add("/agent/tasks/submit", agent_submit, ["POST"])
+    add("/agent/tasks/submit_batch", agent_submit_batch, ["POST"])
     add("/agent/tasks/next", agent_next, ["GET"])
+    add("/agent/tasks/stream", agent_stream, ["GET"])
     add("/agent/tasks/result", agent_result, ["POST"])
+    add("/agent/tasks/heartbeat", agent_heartbeat, ["POST"])
     add("/agent/tasks/recent", agent_recent, ["GET"])
+    add("/agent/tasks/stats", agent_stats, ["GET"])
+    add("/agent/tasks/compact", agent_compact, ["POST"])
+    add("/agent/tasks/{tid:int}/log", agent_log, ["GET", "POST"])
     add("/agent/tasks/{tid:int}", agent_task_get, ["GET"])
 
 try:
@@ -0,0 +1,135 @@
+import os, re, json, signal, asyncio, subprocess
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+# Shared subprocess runner for async handlers: asyncio subprocesses instead of
+# subprocess.run (which blocks the event loop for the whole command), a
+# process-wide concurrency cap, and kill-on-cancel. Children get their own
+# session so a timeout or a disconnect kills the whole group (git spawns
+# ssh/credential helpers that would otherwise survive and hold the pipes).
+MAX_PROCS = int(os.getenv("STATION_PROC_MAX", "4"))
+DISCONNECT_POLL_SEC = 0.5
+LINE_MAX = 64 * 1024
+
+_EOL = re.compile(rb"\r\n|\r|\n")  # \r too: git progress redraws with it
+_state: Dict[str, Any] = {"loop": None, "sem": None}
+
+def _slot() -> asyncio.Semaphore:
+    # Semaphores are bound to the loop that created them.
+    loop = asyncio.get_running_loop()
+    if _state["loop"] is not loop:
+        _state.update(loop=loop, sem=asyncio.Semaphore(MAX_PROCS))
+    return _state["sem"]
+
+async def _spawn(cmd: Sequence[str], cwd: Optional[str], env: Optional[dict]):
+    return await asyncio.create_subprocess_exec(
+        *cmd, cwd=cwd, env=env, stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        start_new_session=True)
+
+async def _reap(proc):
+    if proc.returncode is None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    await proc.wait()
+
+async def _disconnected(request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SEC)
+
+async def run(cmd: Sequence[str], cwd: Optional[str] = None, timeout: float = 60,
+              env: Optional[dict] = None, request=None) -> Tuple[int, str, str]:
+    """Drop-in for the subprocess.run based helpers: (rc, stdout, stderr),
+    stripped. Raises subprocess.TimeoutExpired like subprocess.run. With
+    `request`, a client disconnect kills the process and returns rc -1."""
+    async with _slot():
+        proc = await _spawn(cmd, cwd, env)
+        comm = asyncio.ensure_future(proc.communicate())
+        watch = asyncio.ensure_future(_disconnected(request)) if request is not None else None
+        try:
+            await asyncio.wait([t for t in (comm, watch) if t], timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not comm.done():
+                await _reap(proc)
+                if watch is not None and watch.done():
+                    return -1, "", "cancelled: client disconnected"
+                raise subprocess.TimeoutExpired(list(cmd), timeout)
+            out, err = comm.result()
+            return proc.returncode, out.decode("utf-8", "replace").strip(), err.decode("utf-8", "replace").strip()
+        finally:
+            for t in (comm, watch):
+                if t is not None and not t.done():
+                    t.cancel()
+            await _reap(proc)
+
+async def _pump(name: str, reader: asyncio.StreamReader, q: asyncio.Queue):
+    buf = b""
+    while True:
+        chunk = await reader.read(65536)
+        if not chunk:
+            break
+        *lines, buf = _EOL.split(buf + chunk)
+        if len(buf) > LINE_MAX:
+            lines.append(buf)
+            buf = b""
+        for line in lines:
+            if line:
+                await q.put((name, line.decode("utf-8", "replace")))
+    if buf:
+        await q.put((name, buf.decode("utf-8", "replace")))
+    await q.put((name, None))
+
+async def stream(cmd: Sequence[str], cwd: Optional[str] = None, timeout: float = 60,
+                 env: Optional[dict] = None) -> AsyncIterator[Tuple[str, str]]:
+    """Yields ("stdout"|"stderr", line) as the process writes, then
+    ("exit", json) once. The queue is bounded, so a slow consumer stalls the
+    child on a full pipe instead of buffering its output here. Closing the
+    generator early (client went away) kills the process."""
+    loop = asyncio.get_running_loop()
+    async with _slot():
+        t0 = loop.time()
+        proc = await _spawn(cmd, cwd, env)
+        q: asyncio.Queue = asyncio.Queue(maxsize=256)
+        pumps = [asyncio.ensure_future(_pump("stdout", proc.stdout, q)),
+                 asyncio.ensure_future(_pump("stderr", proc.stderr, q))]
+        timed_out = False
+        try:
+            open_pipes = 2
+            while open_pipes:
+                left = t0 + timeout - loop.time()
+                try:
+                    name, line = await asyncio.wait_for(q.get(), max(left, 0))
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    break
+                if line is None:
+                    open_pipes -= 1
+                else:
+                    yield name, line
+            if not timed_out:
+                try:
+                    await asyncio.wait_for(proc.wait(), max(t0 + timeout - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    timed_out = True
+            await _reap(proc)
+            yield "exit", json.dumps({"rc": proc.returncode, "timeout": timed_out,
+                                      "ms": round((loop.time() - t0) * 1000, 1)})
+        finally:
+            for t in pumps:
+                t.cancel()
+            await _reap(proc)
+
+async def sse(events: AsyncIterator[Tuple[str, str]]) -> AsyncIterator[bytes]:
+    try:
+        async for event, data in events:
+            yield f"event: {event}\ndata: {data}\n\n".encode()
+    finally:
+        await events.aclose()
+
+def sse_response(events: AsyncIterator[Tuple[str, str]]):
+    """StreamingResponse for `events`; Starlette closes the generator (and so
+    kills the process) when the client disconnects."""
+    from starlette.responses import StreamingResponse
+    return StreamingResponse(sse(events), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,125 @@
+import os, time, sqlite3, threading
+from typing import Dict, Tuple
+
+# GCRA (generic cell rate algorithm): each key stores one float, its
+# "theoretical arrival time". A check is O(1) regardless of the limit, and a
+# key whose TAT is in the past is indistinguishable from a fresh one, so idle
+# keys can be dropped at any time.
+#
+# STATION_RATELIMIT_DB=/path/to/rl.sqlite3 keeps the TATs in SQLite so the
+# limit holds across several uvicorn workers/processes on one host.
+DB_PATH = os.getenv("STATION_RATELIMIT_DB", "")
+SWEEP_SEC = float(os.getenv("STATION_RATELIMIT_SWEEP_SEC", "60"))
+
+class MemoryStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tat: Dict[str, float] = {}
+        self.last_sweep = time.monotonic()
+
+    def update(self, key: str, now: float, interval: float, tolerance: float) -> Tuple[bool, float]:
+        with self.lock:
+            if now - self.last_sweep >= SWEEP_SEC:
+                self._sweep(now)
+            tat = max(self.tat.get(key, now), now)
+            if tat - now > tolerance:
+                return False, tat - now - tolerance
+            self.tat[key] = tat + interval
+            return True, 0.0
+
+    def _sweep(self, now: float):
+        for k in [k for k, t in self.tat.items() if t <= now]:
+            del self.tat[k]
+        self.last_sweep = now
+
+    def __len__(self):
+        return len(self.tat)
+
+class SqliteStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self.last_sweep = 0.0
+        con = self._db()
+        con.execute("CREATE TABLE IF NOT EXISTS rl (k TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID")
+
+    def _db(self) -> sqlite3.Connection:
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=OFF")  # limiter state, not data
+            self.local.con = con
+        return con
+
+    def update(self, key: str, now: float, interval: float, tolerance: float) -> Tuple[bool, float]:
+        con = self._db()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if now - self.last_sweep >= SWEEP_SEC:
+                con.execute("DELETE FROM rl WHERE tat <= ?", (now,))
+                self.last_sweep = now
+            row = con.execute("SELECT tat FROM rl WHERE k=?", (key,)).fetchone()
+            tat = max(row[0] if row else now, now)
+            if tat - now > tolerance:
+                con.execute("COMMIT")
+                return False, tat - now - tolerance
+            con.execute("INSERT INTO rl(k, tat) VALUES(?, ?) ON CONFLICT(k) DO UPDATE SET tat=excluded.tat", (key, tat + interval))
+            con.execute("COMMIT")
+            return True, 0.0
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM rl").fetchone()[0]
+
+class Limiter:
+    """`limit` requests per `window_sec` per key: a fresh key gets a burst of
+    exactly `limit`, afterwards one request every window_sec/limit."""
+    def __init__(self, limit: int, window_sec: float, store=None, name: str = ""):
+        limit = max(1, limit)
+        self.interval = window_sec / limit
+        # A request passes while its TAT is at most `tolerance` ahead of now,
+        # so limit-1 intervals of slack give a burst of `limit`. The epsilon
+        # keeps float error in the summed intervals (e.g. 60/7) from turning
+        # the last request of the burst away.
+        self.tolerance = self.interval * (limit - 1) + self.interval * 1e-6
+        self.store = store if store is not None else MemoryStore()
+        self.prefix = f"{name}:{limit}/{window_sec}:" if name else ""
+        # The SQLite store is shared between processes, so it needs wall time.
+        self.clock = time.time if isinstance(self.store, SqliteStore) else time.monotonic
+
+    def check(self, key: str) -> Tuple[bool, float]:
+        """(allowed, retry_after_sec)."""
+        return self.store.update(self.prefix + key, self.clock(), self.interval, self.tolerance)
+
+    def allow(self, key: str) -> bool:
+        return self.check(key)[0]
+
+_limiters: Dict[Tuple[str, int, float], Limiter] = {}
+_limiters_lock = threading.Lock()
+_shared_store = None
+
+def _default_store():
+    global _shared_store
+    if _shared_store is None:
+        _shared_store = SqliteStore(DB_PATH) if DB_PATH else MemoryStore()
+    return _shared_store
+
+def get(name: str, limit: int, window_sec: float) -> Limiter:
+    # One limiter per (call site, limit, window), all on the process-wide store.
+    k = (name, limit, window_sec)
+    lim = _limiters.get(k)
+    if lim is None:
+        with _limiters_lock:
+            lim = _limiters.get(k)
+            if lim is None:
+                lim = _limiters[k] = Limiter(limit, window_sec, _default_store(), name)
+    return lim
+
+def allow(name: str, key: str, limit: int, window_sec: float) -> bool:
+    return get(name, limit, window_sec).allow(key)
+
+def check(name: str, key: str, limit: int, window_sec: float) -> Tuple[bool, float]:
+    return get(name, limit, window_sec).check(key)
@@ -1,21 +1,110 @@
-import os, platform, subprocess, pathlib
+import os, time, signal, asyncio, platform, pathlib, threading
+from concurrent.futures import ThreadPoolExecutor
 
-def _cmd(s: str) -> str:
+# Toolchain probes run concurrently as asyncio subprocesses; results are cached
+# for TTL_SEC and served stale while a background refresh runs.
+PROBES = {
+    "python": "python -V",
+    "node": "node -v",
+    "npm": "npm -v",
+    "git": "git --version",
+}
+TTL_SEC = float(os.environ.get("STATION_DOCTOR_TTL_SEC", "300"))
+PROBE_TIMEOUT = float(os.environ.get("STATION_DOCTOR_TIMEOUT", "3"))
+
+_cache = {"at": 0.0, "probes": None}
+_refresh_lock = threading.Lock()
+_refresher = None
+
+async def _probe(name: str, cmd: str, timeout: float):
+    t0 = time.perf_counter()
+    info = {"ok": False}
+    out = b""
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True)
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+            info["ok"] = proc.returncode == 0
+        except asyncio.TimeoutError:
+            # Kill the whole group: the shell's children would otherwise keep
+            # the pipe open and the probe would still wait for them.
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            info["error"] = "timeout"
+    except Exception as e:
+        info["error"] = str(e)
+    info["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    info["output"] = out.decode("utf-8", "ignore").strip() if info["ok"] else ""
+    return name, info
+
+async def probe_all(timeout: float = PROBE_TIMEOUT) -> dict:
+    t0 = time.perf_counter()
+    res = dict(await asyncio.gather(*(_probe(n, c, timeout) for n, c in PROBES.items())))
+    return {"results": res, "total_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+def _run(coro):
+    # Callers may be plain threads or already inside an event loop.
     try:
-        out = subprocess.check_output(s, shell=True, stderr=subprocess.STDOUT, timeout=3)
-        return out.decode("utf-8", "ignore").strip()
-    except Exception:
-        return ""
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()
+
+def refresh(block: bool = True) -> bool:
+    """Re-run all probes. Concurrent callers share one run; with block=False
+    an already-running refresh is left alone."""
+    started = _cache["at"]
+    if not _refresh_lock.acquire(blocking=block):
+        return False
+    try:
+        if block and _cache["at"] != started:
+            return True  # another caller refreshed while we waited
+        _cache["probes"] = _run(probe_all())
+        _cache["at"] = time.time()
+        return True
+    finally:
+        _refresh_lock.release()
+
+def probes(force: bool = False) -> dict:
+    age = time.time() - _cache["at"]
+    if force or _cache["probes"] is None:
+        refresh()
+    elif age > TTL_SEC:
+        threading.Thread(target=refresh, kwargs={"block": False}, name="doctor-refresh", daemon=True).start()
+    return {**_cache["probes"], "cached_at": _cache["at"], "age_sec": round(time.time() - _cache["at"], 1)}
+
+def start_refresher(interval: float = TTL_SEC / 2):
+    # Keeps the cache warm so doctor calls never wait on subprocesses.
+    global _refresher
+    if _refresher and _refresher.is_alive():
+        return
+    def loop():
+        while True:
+            try:
+                refresh(block=False)
+            except Exception:
+                pass
+            time.sleep(max(1.0, interval))
+    _refresher = threading.Thread(target=loop, name="doctor-refresher", daemon=True)
+    _refresher.start()
 
 def doctor(_payload=None):
     root = os.environ.get("STATION_ROOT", str(pathlib.Path.home() / "station_root"))
-    return {
-        "status": "ok",
-        "mode": "termux-safe",
-        "python": _cmd("python -V"),
-        "node": _cmd("node -v"),
-        "npm": _cmd("npm -v"),
-        "git": _cmd("git --version"),
+    p = probes(force=bool((_payload or {}).get("refresh")))
+    out = {"status": "ok", "mode": "termux-safe"}
+    out.update({name: r["output"] for name, r in p["results"].items()})
+    out.update({
         "platform": platform.platform(),
-        "root": root
-    }
+        "root": root,
+        "probes": {name: {k: v for k, v in r.items() if k != "output"} for name, r in p["results"].items()},
+        "probe_total_ms": p["total_ms"],
+        "cached_at": p["cached_at"],
+        "age_sec": p["age_sec"],
+    })
+    return out
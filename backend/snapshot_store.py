@@ -0,0 +1,248 @@
+import os, re, json, time, zlib, uuid, fcntl, hashlib, pathlib, contextlib, collections
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+# Content-addressed snapshots: every file is split into CHUNK_SIZE blocks,
+# each block is stored once under chunks/<sha256[:2]>/<sha256> (zlib), and a
+# snapshot is a JSON manifest of path -> size/mtime/mode/chunk list.
+# Files whose size and mtime match the previous manifest are not re-read.
+CHUNK_SIZE = int(os.getenv("STATION_SNAPSHOT_CHUNK", str(4 * 1024 * 1024)))
+LEVEL = int(os.getenv("STATION_SNAPSHOT_LEVEL", "6"))
+WORKERS = int(os.getenv("STATION_SNAPSHOT_WORKERS", str(os.cpu_count() or 2)))
+
+_ID_RE = re.compile(r"snap_(\d{8}_\d{6}Z)_(\d+)$")
+
+@contextlib.contextmanager
+def _store_lock(store: pathlib.Path, shared: bool = False):
+    # flock on <store>/.lock: snapshot() and gc() take it exclusively so gc can
+    # never drop chunks a snapshot in progress (any process) is reusing.
+    store.mkdir(parents=True, exist_ok=True)
+    with open(store / ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _next_id(store: pathlib.Path, t: float) -> str:
+    # UTC second plus a store-wide sequence (taken under the store lock), so
+    # ids sort in creation order even within one second or after a clock step back.
+    names = sorted(p.stem for p in (store / "manifests").glob("*.json"))
+    m = _ID_RE.match(names[-1]) if names else None
+    seq = int(m.group(2)) + 1 if m else len(names) + 1
+    stamp = time.strftime("%Y%m%d_%H%M%SZ", time.gmtime(t))
+    if m and stamp < m.group(1):
+        stamp = m.group(1)
+    return f"snap_{stamp}_{seq:06d}"
+
+def _chunk_path(store: pathlib.Path, h: str) -> pathlib.Path:
+    return store / "chunks" / h[:2] / h
+
+def _write_atomic(p: pathlib.Path, data: bytes) -> None:
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f"{p.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, p)
+
+def _put_chunk(store: pathlib.Path, data: bytes) -> Tuple[str, int]:
+    # sha256 and zlib both release the GIL on large buffers, so a thread pool
+    # spreads hashing/compression across cores.
+    h = hashlib.sha256(data).hexdigest()
+    p = _chunk_path(store, h)
+    if p.exists():
+        return h, 0
+    z = zlib.compress(data, LEVEL)
+    _write_atomic(p, z)
+    return h, len(z)
+
+def _get_chunk(store: pathlib.Path, h: str) -> bytes:
+    return zlib.decompress(_chunk_path(store, h).read_bytes())
+
+def _walk(root: pathlib.Path, exclude: Iterable[str]) -> Iterable[Tuple[str, os.stat_result, Optional[str]]]:
+    skip = {e.strip("/") for e in exclude if e}
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        dirnames[:] = sorted(d for d in dirnames if os.path.join(rel_dir, d) not in skip)
+        for name in sorted(filenames):
+            rel = os.path.join(rel_dir, name)
+            if rel in skip:
+                continue
+            full = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(full)
+                link = os.readlink(full) if os.path.islink(full) else None
+            except OSError:
+                continue  # vanished mid-walk
+            yield rel, st, link
+
+def list_snapshots(store_dir: str) -> List[Dict[str, Any]]:
+    mdir = pathlib.Path(store_dir) / "manifests"
+    out = []
+    for p in sorted(mdir.glob("*.json")):
+        try:
+            m = json.loads(p.read_text())
+        except Exception:
+            continue
+        out.append({"id": m["id"], "created_at": m["created_at"], "files": len(m["files"]), "stats": m.get("stats", {})})
+    return out
+
+def load_manifest(store_dir: str, snap_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    mdir = pathlib.Path(store_dir) / "manifests"
+    if snap_id is None:
+        names = sorted(mdir.glob("*.json"))
+        if not names:
+            return None
+        p = names[-1]
+    else:
+        p = mdir / f"{pathlib.Path(snap_id).name}.json"
+        if not p.exists():
+            return None
+    return json.loads(p.read_text())
+
+def snapshot(root: str, store_dir: str, exclude: Iterable[str] = (), workers: Optional[int] = None,
+             sources: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """`sources` maps a relative path to the file whose bytes are stored for it
+    instead of root/rel, e.g. a consistent copy of a live SQLite database."""
+    with _store_lock(pathlib.Path(store_dir)):
+        return _snapshot(root, store_dir, exclude, workers, sources or {})
+
+def _snapshot(root: str, store_dir: str, exclude: Iterable[str], workers: Optional[int],
+              sources: Dict[str, str]) -> Dict[str, Any]:
+    t0 = time.time()
+    root_p, store = pathlib.Path(root), pathlib.Path(store_dir)
+    prev = (load_manifest(store_dir) or {}).get("files", {})
+    files: Dict[str, Dict[str, Any]] = {}
+    stats = collections.Counter()
+    workers = workers or WORKERS
+    inflight: collections.deque = collections.deque()
+
+    def drain(limit: int):
+        while len(inflight) > limit:
+            entry, idx, fut = inflight.popleft()
+            h, new_bytes = fut.result()
+            entry["chunks"][idx] = h
+            if new_bytes:
+                stats["chunks_new"] += 1
+                stats["bytes_stored"] += new_bytes
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snap") as ex:
+        for rel, st, link in _walk(root_p, exclude):
+            stats["files"] += 1
+            if link is not None:
+                files[rel] = {"link": link}
+                continue
+            src = sources.get(rel) or str(root_p / rel)
+            if rel in sources:
+                try:
+                    st = os.stat(src)
+                except OSError:
+                    stats["files_unreadable"] += 1
+                    continue
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "mode": st.st_mode & 0o7777}
+            old = prev.get(rel)
+            if old and old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns and "chunks" in old:
+                entry["chunks"] = old["chunks"]
+                stats["files_unchanged"] += 1
+                files[rel] = entry
+                continue
+            entry["chunks"] = []
+            try:
+                with open(src, "rb") as f:
+                    while True:
+                        data = f.read(CHUNK_SIZE)
+                        if not data:
+                            break
+                        entry["chunks"].append(None)
+                        inflight.append((entry, len(entry["chunks"]) - 1, ex.submit(_put_chunk, store, data)))
+                        stats["bytes_read"] += len(data)
+                        # Bound memory: at most ~2 chunks per worker waiting.
+                        drain(workers * 2)
+            except OSError:
+                stats["files_unreadable"] += 1
+                continue
+            stats["files_hashed"] += 1
+            files[rel] = entry
+        drain(0)
+
+    snap_id = _next_id(store, t0)
+    stats = dict(stats, seconds=round(time.time() - t0, 3))
+    manifest = {"id": snap_id, "created_at": t0, "root": str(root_p), "chunk_size": CHUNK_SIZE, "files": files, "stats": stats}
+    _write_atomic(store / "manifests" / f"{snap_id}.json", json.dumps(manifest, separators=(",", ":")).encode())
+    return {"snapshot": snap_id, "stats": stats}
+
+def _selected(rel: str, paths: Optional[List[str]]) -> bool:
+    if not paths:
+        return True
+    return any(rel == p or rel.startswith(p.rstrip("/") + "/") for p in paths)
+
+def restore(root: str, store_dir: str, snap_id: Optional[str] = None, paths: Optional[List[str]] = None,
+            workers: Optional[int] = None) -> Dict[str, Any]:
+    """Write the selected paths of a snapshot back under root. Files already
+    matching the manifest's size and mtime are left alone; nothing is deleted."""
+    with _store_lock(pathlib.Path(store_dir), shared=True):
+        return _restore(root, store_dir, snap_id, paths, workers)
+
+def _restore(root: str, store_dir: str, snap_id: Optional[str], paths: Optional[List[str]],
+             workers: Optional[int]) -> Dict[str, Any]:
+    t0 = time.time()
+    m = load_manifest(store_dir, snap_id)
+    if m is None:
+        return {"error": "snapshot not found", "snapshot": snap_id}
+    store, base = pathlib.Path(store_dir), pathlib.Path(root).resolve()
+    stats = collections.Counter()
+
+    def restore_one(rel: str, entry: Dict[str, Any]) -> str:
+        tgt = pathlib.Path(os.path.normpath(base / rel))
+        parent = tgt.parent.resolve()
+        if parent != base and base not in parent.parents:
+            return "skipped"
+        tgt.parent.mkdir(parents=True, exist_ok=True)
+        if "link" in entry:
+            if tgt.is_symlink() or tgt.exists():
+                tgt.unlink()
+            os.symlink(entry["link"], tgt)
+            return "restored"
+        try:
+            st = tgt.stat()
+            if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+                return "unchanged"
+        except OSError:
+            pass
+        tmp = tgt.with_name(f"{tgt.name}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp, "wb") as f:
+            for h in entry["chunks"]:
+                f.write(_get_chunk(store, h))
+        os.chmod(tmp, entry.get("mode", 0o644))
+        os.utime(tmp, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        os.replace(tmp, tgt)
+        return "restored"
+
+    chosen = [(rel, e) for rel, e in m["files"].items() if _selected(rel, paths)]
+    with ThreadPoolExecutor(max_workers=workers or WORKERS, thread_name_prefix="restore") as ex:
+        for outcome in ex.map(lambda it: restore_one(*it), chosen):
+            stats[outcome] += 1
+    return {"snapshot": m["id"], "paths": paths or ["*"], "stats": dict(stats, seconds=round(time.time() - t0, 3))}
+
+def gc(store_dir: str, keep: int) -> Dict[str, int]:
+    # Drop all but the newest `keep` manifests, then any chunk no manifest
+    # references. Serialized against snapshot() and restore() by the store lock.
+    store = pathlib.Path(store_dir)
+    with _store_lock(store):
+        return _gc(store, keep)
+
+def _gc(store: pathlib.Path, keep: int) -> Dict[str, int]:
+    manifests = sorted((store / "manifests").glob("*.json"))
+    dropped = manifests[:-keep] if keep > 0 else manifests
+    for p in dropped:
+        p.unlink()
+    live = set()
+    for p in manifests[len(dropped):]:
+        for e in json.loads(p.read_text())["files"].values():
+            live.update(e.get("chunks", ()))
+    removed = 0
+    for p in (store / "chunks").glob("*/*"):
+        if p.name not in live:
+            p.unlink()
+            removed += 1
+    return {"manifests_removed": len(dropped), "chunks_removed": removed}
@@ -14,7 +14,7 @@ source "$ENV" || true
 echo "==== LOOP5 START $(date -Iseconds) ====" | tee -a "$LOG"
 
 while true; do
-  JSON=$(curl -s "$API/agent/tasks/recent?limit=10" -H "x-edit-key: $EDIT" || true)
+  JSON=$(curl -s "$API/agent/tasks/recent?limit=10&status=queued&task_type=shell&full=1" -H "x-edit-key: $EDIT" || true)
 
   # Extract queued tasks with python (Termux-safe)
   python - <<'PY' "$JSON" "$ROOT" "$LOG"
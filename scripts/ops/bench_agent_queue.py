@@ -0,0 +1,31 @@
+import os, sys, time, tempfile
+
+# usage: python scripts/ops/bench_agent_queue.py [N]
+# Measures agent_queue ops/sec against a throwaway database file.
+N=int(sys.argv[1]) if len(sys.argv)>1 else 2000
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+BACKEND=os.path.abspath(os.path.join(HERE,"..","..","backend"))
+TMP=tempfile.mkdtemp(prefix="bench_agent_queue_")
+os.environ["STATION_AGENT_DB"]=os.path.join(TMP,"agent_queue.sqlite3")
+sys.path.insert(0, BACKEND)
+
+import agent_queue as aq
+
+def bench(name, fn, n):
+    t0=time.perf_counter()
+    for i in range(n):
+        fn(i)
+    dt=time.perf_counter()-t0
+    print(f">>> [bench_agent_queue] {name:<12} {n:>6} ops  {n/dt:>10.0f} ops/sec")
+
+def main():
+    ids=[]
+    bench("submit", lambda i: ids.append(aq.submit_task("shell", {"cmd": f"echo {i}"})), N)
+    bench("claim_next", lambda i: aq.claim_next("bench"), N)
+    bench("set_result", lambda i: aq.set_result(ids[i], "bench", True, {"rc": 0}), N)
+    bench("get_task", lambda i: aq.get_task(ids[i]), N)
+    bench("list_recent", lambda i: aq.list_recent(25), max(1, N//20))
+
+if __name__=="__main__":
+    main()
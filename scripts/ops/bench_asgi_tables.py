@@ -0,0 +1,66 @@
+import os, sys, time, json, uuid, random, tempfile
+
+# usage: python scripts/ops/bench_asgi_tables.py [ROWS]
+# Fills throwaway jobs/audit tables with ROWS rows each (default 1M) and times
+# the /ops/jobs and /ops/audit queries with and without the asgi indexes.
+ROWS=int(sys.argv[1]) if len(sys.argv)>1 else 1_000_000
+REPS=20
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+BACKEND=os.path.abspath(os.path.join(HERE,"..","..","backend"))
+TMP=tempfile.mkdtemp(prefix="bench_asgi_tables_")
+os.environ["STATION_ROOT"]=TMP
+os.environ["STATION_AUDIT_FLUSH_MS"]="10"
+sys.path.insert(0, BACKEND)
+
+import asgi
+
+INDEXES=("idx_jobs_created_id","idx_jobs_room_status_id","idx_jobs_status_created_id","idx_audit_ts_id","idx_audit_action_ts_id")
+ROOMS=("fs","doctor","snapshot","env","rooms_list")
+STATUSES=("done","done","done","failed","queued")
+ACTIONS=("ops_run","ops_enqueue","jobs_recover","login","deploy")
+
+def fill():
+    con=asgi.db()
+    t0=time.time()-ROWS
+    con.execute("BEGIN")
+    con.executemany("INSERT INTO jobs(id,room,status,created_at,updated_at,payload) VALUES(?,?,?,?,?,?)",
+        ((uuid.uuid4().hex, random.choice(ROOMS), random.choice(STATUSES), t0+i, t0+i, "{}") for i in range(ROWS)))
+    con.executemany("INSERT INTO audit(id,ts,actor,action,data) VALUES(?,?,?,?,?)",
+        ((uuid.uuid4().hex, t0+i, "local", random.choice(ACTIONS), json.dumps({"i": i})) for i in range(ROWS)))
+    con.execute("COMMIT")
+    con.execute("ANALYZE")
+
+def cases():
+    mid=time.time()-ROWS/2
+    return [
+        ("jobs latest",           lambda: asgi.jobs_list(50)),
+        ("jobs before_ts",        lambda: asgi.jobs_list(50, before_ts=mid)),
+        ("jobs before (ts,id)",   lambda: asgi.jobs_list(50, before_ts=mid, before_id="8")),
+        ("jobs room+status",      lambda: asgi.jobs_list(50, room="snapshot", status="failed")),
+        ("audit latest",          lambda: asgi.audit_list(100)),
+        ("audit before_ts",       lambda: asgi.audit_list(100, before_ts=mid)),
+        ("audit before (ts,id)",  lambda: asgi.audit_list(100, before_ts=mid, before_id="8")),
+        ("audit action+before",   lambda: asgi.audit_list(100, before_ts=mid, action="deploy")),
+    ]
+
+def run(label):
+    for name, fn in cases():
+        t0=time.perf_counter()
+        for _ in range(REPS):
+            fn()
+        ms=(time.perf_counter()-t0)/REPS*1000
+        print(f">>> [bench_asgi_tables] {label:<10} {name:<22} {ms:>9.2f} ms/query")
+
+def main():
+    t0=time.perf_counter()
+    fill()
+    print(f">>> [bench_asgi_tables] filled {ROWS} jobs + {ROWS} audit rows in {time.perf_counter()-t0:.1f}s ({TMP})")
+    run("indexed")
+    con=asgi.db()
+    for name in INDEXES:
+        con.execute(f"DROP INDEX IF EXISTS {name}")
+    run("no-index")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,63 @@
+import os, sys, time, random, tempfile
+
+# usage: python scripts/ops/bench_ratelimit.py [N]
+# Checks/sec of the shared GCRA limiter (memory and SQLite stores) against the
+# list-of-timestamps limiter it replaced, at a small and a large limit.
+# First checks, on a frozen clock, that a fresh key gets exactly `limit`
+# requests through in one window, no more and no fewer.
+N=int(sys.argv[1]) if len(sys.argv)>1 else 200000
+KEYS=1000
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+BACKEND=os.path.abspath(os.path.join(HERE,"..","..","backend"))
+sys.path.insert(0, BACKEND)
+
+import ratelimit
+
+def legacy(limit, window):
+    bucket={}
+    def allow(key):
+        t=time.time()
+        arr=[x for x in bucket.get(key, []) if t-x <= window]
+        if len(arr) >= limit:
+            return False
+        arr.append(t)
+        bucket[key]=arr
+        return True
+    return allow
+
+def bench(name, allow, n):
+    keys=[f"10.0.{i//256}.{i%256}" for i in range(KEYS)]
+    seq=[random.choice(keys) for _ in range(n)]
+    t0=time.perf_counter()
+    ok=0
+    for k in seq:
+        ok+=allow(k)
+    dt=time.perf_counter()-t0
+    print(f">>> [bench_ratelimit] {name:<28} {n:>7} checks  {n/dt:>10.0f} checks/sec  allowed={ok}")
+
+def fresh_window(name, lim, limit):
+    lim.clock=lambda: 1000.0
+    ok=0
+    while lim.allow("fresh") and ok <= limit:
+        ok+=1
+    good=ok==limit
+    print(f">>> [bench_ratelimit] {'ok  ' if good else 'FAIL'} {name:<24} fresh window allowed {ok}/{limit}")
+    return good
+
+def main():
+    db=os.path.join(tempfile.mkdtemp(prefix="bench_ratelimit_"),"rl.sqlite3")
+    results=[]
+    for limit in (1, 3, 7, 60, 100, 5000):
+        for window in (1, 60):
+            results.append(fresh_window(f"memory {limit}/{window}s", ratelimit.Limiter(limit, window), limit))
+            results.append(fresh_window(f"sqlite {limit}/{window}s", ratelimit.Limiter(limit, window, ratelimit.SqliteStore(db), "fresh"), limit))
+    if not all(results):
+        raise SystemExit(1)
+    for limit in (60, 5000):
+        bench(f"legacy list  limit={limit}", legacy(limit, 60), N)
+        bench(f"gcra memory  limit={limit}", ratelimit.Limiter(limit, 60).allow, N)
+        bench(f"gcra sqlite  limit={limit}", ratelimit.Limiter(limit, 60, ratelimit.SqliteStore(db), f"b{limit}").allow, max(1, N//10))
+
+if __name__=="__main__":
+    main()
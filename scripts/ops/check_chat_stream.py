@@ -0,0 +1,108 @@
+import os, sys, time, json, socket, asyncio, tempfile, threading
+
+# usage: python scripts/ops/check_chat_stream.py [EVENTS] [INTERVAL_SEC]
+# Runs a fake OpenAI-style SSE upstream and the Starlette backend in-process,
+# then checks POST /chat with stream=true: the first byte must arrive after
+# about one upstream interval (not after the whole generation), every event
+# must come through in both sse and jsonl formats, and a client that
+# disconnects mid-stream must make the backend drop the upstream request.
+N=int(sys.argv[1]) if len(sys.argv)>1 else 10
+INTERVAL=float(sys.argv[2]) if len(sys.argv)>2 else 0.2
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+BACKEND=os.path.abspath(os.path.join(HERE,"..","..","backend"))
+TMP=tempfile.mkdtemp(prefix="check_chat_stream_")
+
+def free_port():
+    s=socket.socket(); s.bind(("127.0.0.1",0)); p=s.getsockname()[1]; s.close(); return p
+
+UP_PORT, APP_PORT = free_port(), free_port()
+os.environ["STATION_OPENAI_BASE_URL"]=f"http://127.0.0.1:{UP_PORT}/v1"
+os.environ["STATION_AGENT_DB"]=os.path.join(TMP,"agent_queue.sqlite3")
+sys.path.insert(0, BACKEND)
+
+import httpx, uvicorn
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+upstream={"started":0,"sent":0,"cancelled":0,"finished":0}
+
+async def fake_responses(request):
+    body=await request.json()
+    assert body.get("stream") is True, body
+    async def events():
+        upstream["started"]+=1
+        try:
+            for i in range(N):
+                await asyncio.sleep(INTERVAL)
+                data=json.dumps({"type":"response.output_text.delta","delta":f"tok{i} "})
+                yield f"event: response.output_text.delta\ndata: {data}\n\n".encode()
+                upstream["sent"]+=1
+            yield b"data: [DONE]\n\n"
+            upstream["finished"]+=1
+        except asyncio.CancelledError:
+            upstream["cancelled"]+=1
+            raise
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+stub=Starlette(routes=[Route("/v1/responses", fake_responses, methods=["POST"])])
+
+def serve(app, port):
+    srv=uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=srv.run, daemon=True).start()
+    return srv
+
+async def wait_up(url):
+    async with httpx.AsyncClient() as c:
+        for _ in range(100):
+            try:
+                await c.get(url); return
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+    raise SystemExit(f"not up: {url}")
+
+def check(ok, msg):
+    print(f">>> [check_chat_stream] {'ok  ' if ok else 'FAIL'} {msg}")
+    return ok
+
+async def full(c, base, fmt):
+    t0=time.perf_counter(); ttfb=None; buf=b""
+    async with c.stream("POST", base+"/chat", json={"input":"hi","api_key":"sk-stub","stream":True,"format":fmt}) as r:
+        async for chunk in r.aiter_raw():
+            if ttfb is None:
+                ttfb=time.perf_counter()-t0
+            buf+=chunk
+    total=time.perf_counter()-t0
+    text=buf.decode()
+    n=(text.count("event: response.output_text.delta") if fmt=="sse"
+       else sum(1 for l in text.splitlines() if l and json.loads(l)["type"]=="response.output_text.delta"))
+    good=check(r.status_code==200 and n==N, f"{fmt}: status {r.status_code}, {n}/{N} events")
+    good&=check(ttfb is not None and ttfb < INTERVAL*3, f"{fmt}: first byte {ttfb:.3f}s, full stream {total:.3f}s "
+                f"(buffered would be ~{N*INTERVAL:.1f}s)")
+    return good
+
+async def disconnect(c, base, after):
+    before=dict(upstream); got=0
+    async with c.stream("POST", base+"/chat", json={"input":"hi","api_key":"sk-stub","stream":True}) as r:
+        async for chunk in r.aiter_raw():
+            got+=chunk.count(b"event: response.output_text.delta")
+            if got>=after:
+                break  # leaving the block closes the connection mid-stream
+    await asyncio.sleep(INTERVAL*3)
+    cancelled=upstream["cancelled"]-before["cancelled"]
+    sent=upstream["sent"]-before["sent"]
+    return check(cancelled==1 and sent<N, f"disconnect after {after}: upstream cancelled={cancelled}, sent {sent}/{N}")
+
+async def main():
+    import main as backend_main
+    serve(stub, UP_PORT); serve(backend_main.app, APP_PORT)
+    base=f"http://127.0.0.1:{APP_PORT}"
+    await wait_up(base+"/health")
+    async with httpx.AsyncClient(timeout=60) as c:
+        results=[await full(c, base, "sse"), await full(c, base, "jsonl"), await disconnect(c, base, 2)]
+    if not all(results):
+        raise SystemExit(1)
+
+if __name__=="__main__":
+    asyncio.run(main())
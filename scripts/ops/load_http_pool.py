@@ -0,0 +1,76 @@
+import os, sys, time, socket, asyncio, tempfile, threading
+
+# usage: python scripts/ops/load_http_pool.py [CONCURRENCY] [UPSTREAM_DELAY_SEC]
+# Runs a stub OpenAI-style upstream and the Starlette backend in-process, fires
+# CONCURRENCY simultaneous POST /chat requests through the shared http_pool
+# and probes /health meanwhile, to show the event loop is not blocked.
+C=int(sys.argv[1]) if len(sys.argv)>1 else 50
+DELAY=float(sys.argv[2]) if len(sys.argv)>2 else 0.5
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+BACKEND=os.path.abspath(os.path.join(HERE,"..","..","backend"))
+TMP=tempfile.mkdtemp(prefix="load_http_pool_")
+
+def free_port():
+    s=socket.socket(); s.bind(("127.0.0.1",0)); p=s.getsockname()[1]; s.close(); return p
+
+UP_PORT, APP_PORT = free_port(), free_port()
+os.environ["STATION_OPENAI_BASE_URL"]=f"http://127.0.0.1:{UP_PORT}/v1"
+os.environ["STATION_AGENT_DB"]=os.path.join(TMP,"agent_queue.sqlite3")
+os.environ.setdefault("STATION_HTTP_PER_HOST", str(max(C, 1)))
+sys.path.insert(0, BACKEND)
+
+import httpx, uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+async def fake_responses(request):
+    body=await request.json()
+    await asyncio.sleep(DELAY)
+    return JSONResponse({"id":"resp_stub","model":body.get("model"),"output":[{"content":[{"type":"output_text","text":"ok"}]}]})
+
+stub=Starlette(routes=[Route("/v1/responses", fake_responses, methods=["POST"])])
+
+def serve(app, port):
+    srv=uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=srv.run, daemon=True).start()
+    return srv
+
+async def wait_up(url):
+    async with httpx.AsyncClient() as c:
+        for _ in range(100):
+            try:
+                await c.get(url); return
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+    raise SystemExit(f"not up: {url}")
+
+async def main():
+    import main as backend_main
+    serve(stub, UP_PORT); serve(backend_main.app, APP_PORT)
+    base=f"http://127.0.0.1:{APP_PORT}"
+    await wait_up(base+"/health")
+    done=asyncio.Event(); probes=[]
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=C+10)) as c:
+        async def probe():
+            while not done.is_set():
+                t=time.perf_counter(); await c.get(base+"/health"); probes.append(time.perf_counter()-t)
+                await asyncio.sleep(0.05)
+        async def chat(i):
+            r=await c.post(base+"/chat", json={"input":f"hi {i}","api_key":"sk-stub"})
+            return r.status_code
+        p=asyncio.create_task(probe())
+        t0=time.perf_counter()
+        codes=await asyncio.gather(*(chat(i) for i in range(C)))
+        dt=time.perf_counter()-t0
+        done.set(); await p
+    ok=sum(1 for x in codes if x==200)
+    print(f">>> [load_http_pool] {C} concurrent /chat, upstream delay {DELAY}s: {ok}/{C} ok in {dt:.2f}s "
+          f"({C/dt:.1f} req/s; serial would take {C*DELAY:.1f}s)")
+    if probes:
+        print(f">>> [load_http_pool] /health during load: n={len(probes)} max={max(probes)*1000:.1f}ms "
+              f"avg={sum(probes)/len(probes)*1000:.1f}ms")
+
+if __name__=="__main__":
+    asyncio.run(main())
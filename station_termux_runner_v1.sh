@@ -5,11 +5,31 @@ BASE_URL="${BASE_URL:-http://127.0.0.1:8000}"
 RUNNER_ID="${RUNNER_ID:-termux}"
 RUNNER_KEY="${STATION_RUNNER_KEY:-runner-1234}"
 
+# A claimed task is leased for STATION_AGENT_LEASE_SEC on the server (default
+# 300s); a task not heartbeated within that is requeued and run again. While a
+# script runs we heartbeat every HEARTBEAT_SEC, which must stay well under the
+# server's lease.
+HEARTBEAT_SEC="${HEARTBEAT_SEC:-60}"
+
 WORKDIR="${WORKDIR:-$HOME/station_root}"
 LOGDIR="$HOME/station_root/station_logs/runner"
 mkdir -p "$LOGDIR"
 
-echo ">>> [runner] BASE_URL=$BASE_URL RUNNER_ID=$RUNNER_ID WORKDIR=$WORKDIR"
+echo ">>> [runner] BASE_URL=$BASE_URL RUNNER_ID=$RUNNER_ID WORKDIR=$WORKDIR HEARTBEAT_SEC=$HEARTBEAT_SEC"
+
+heartbeat_loop() {
+  local tid="$1"
+  local code
+  while sleep "$HEARTBEAT_SEC"; do
+    code="$(curl -s -o /dev/null -w '%{http_code}' -X POST "$BASE_URL/agent/tasks/heartbeat" \
+      -H "x-runner-key: $RUNNER_KEY" -H "Content-Type: application/json" \
+      -d "{\"task_id\":$tid,\"runner_id\":\"$RUNNER_ID\"}" || true)"
+    if [ "$code" = "409" ]; then
+      echo ">>> [runner] task=$tid lease lost (requeued elsewhere)"
+      return 0
+    fi
+  done
+}
 
 run_task_shell() {
   local tid="$1"
@@ -31,9 +51,14 @@ PY
 
   chmod +x "$LOGDIR/task_${tid}_${ts}.sh"
 
+  heartbeat_loop "$tid" &
+  local hb=$!
+
   set +e
   ( cd "$cwd" && bash "$LOGDIR/task_${tid}_${ts}.sh" ) >"$out" 2>"$err"
   local rc=$?
+  kill "$hb" 2>/dev/null
+  wait "$hb" 2>/dev/null
   set -e
 
   local out_tail err_tail
@@ -47,6 +72,7 @@ PY
 import json
 print(json.dumps({
   "task_id": int("$tid"),
+  "runner_id": "$RUNNER_ID",
   "ok": True,
   "result": {"rc": $rc, "stdout_tail": """$out_tail""", "stderr_tail": """$err_tail""", "out_log": "$out", "err_log": "$err"}
 }))
@@ -59,6 +85,7 @@ PY
 import json
 print(json.dumps({
   "task_id": int("$tid"),
+  "runner_id": "$RUNNER_ID",
   "ok": False,
   "error": "command_failed",
   "result": {"rc": $rc, "stdout_tail": """$out_tail""", "stderr_tail": """$err_tail""", "out_log": "$out", "err_log": "$err"}
@@ -107,7 +134,7 @@ PY
     # unsupported task type
     curl -s -X POST "$BASE_URL/agent/tasks/result" \
       -H "x-runner-key: $RUNNER_KEY" -H "Content-Type: application/json" \
-      -d "{\"task_id\":$tid,\"ok\":false,\"error\":\"unsupported_task_type\"}" >/dev/null || true
+      -d "{\"task_id\":$tid,\"runner_id\":\"$RUNNER_ID\",\"ok\":false,\"error\":\"unsupported_task_type\"}" >/dev/null || true
     continue
   fi
 